@@ -0,0 +1,129 @@
+# Sound effect mixing budget. Each sound belongs to a channel group with
+# its own reserved mixer channels, has a cap on how many copies may play
+# at once, and triggers of the same sound within one frame are merged.
+# When a group is full, the new voice steals the least important one
+# (lowest priority, furthest from the listener) or is dropped.
+import pygame
+
+DISTANCE_FALLOFF = 400  # Pixels from the listener that cost one priority point
+
+class _SoundInfo:
+    __slots__ = ("sound", "group", "max_voices", "priority")
+
+    def __init__(self, sound, group, max_voices, priority):
+        self.sound = sound
+        self.group = group
+        self.max_voices = max_voices
+        self.priority = priority
+
+class _Voice:
+    __slots__ = ("channel", "name", "importance", "started")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.name = None
+        self.importance = 0.0
+        self.started = 0
+
+# group -> reserved channels for a budget of name -> (group, max_voices,
+# priority). A group gets exactly enough channels for all of its sounds
+# to play up to their caps at once
+def channel_groups(budget):
+    groups = {}
+    for group, max_voices, _ in budget.values():
+        groups[group] = groups.get(group, 0) + max_voices
+    return groups
+
+class SoundManager:
+    def __init__(self, groups, width=800):
+        total = sum(groups.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        # Keep Sound.play() elsewhere from grabbing our channels
+        pygame.mixer.set_reserved(total)
+
+        self.width = width
+        self.sounds = {}
+        self.groups = {}
+        first = 0
+        for group, count in groups.items():
+            self.groups[group] = [_Voice(pygame.mixer.Channel(first + i)) for i in range(count)]
+            first += count
+        self.pending = {}  # name -> (importance, x) for this frame
+        self.listener_x = width / 2
+        self.frame = 0
+        self.stats = {"played": 0, "coalesced": 0, "stolen": 0, "dropped": 0}
+
+    def register(self, name, sound, group, max_voices=2, priority=1):
+        if sound is not None:
+            self.sounds[name] = _SoundInfo(sound, group, max_voices, priority)
+
+    # Queue a sound for this frame. x is where it happens on screen
+    def play(self, name, x=None):
+        info = self.sounds.get(name)
+        if info is None:
+            return
+        importance = info.priority
+        if x is not None:
+            importance -= abs(x - self.listener_x) / DISTANCE_FALLOFF
+        queued = self.pending.get(name)
+        if queued is not None:
+            self.stats["coalesced"] += 1
+            if queued[0] >= importance:
+                return
+        self.pending[name] = (importance, x)
+
+    # Start this frame's queued sounds. Call once per rendered frame
+    def flush(self):
+        self.frame += 1
+        if not self.pending:
+            return
+        # Most important first so they win any stealing
+        for name, (importance, x) in sorted(self.pending.items(), key=lambda item: -item[1][0]):
+            self._start(name, self.sounds[name], importance, x)
+        self.pending.clear()
+
+    def _start(self, name, info, importance, x):
+        voices = self.groups[info.group]
+        for voice in voices:
+            if voice.name is not None and not voice.channel.get_busy():
+                voice.name = None
+
+        # Over its own cap: replace the oldest copy of the same sound
+        same = [voice for voice in voices if voice.name == name]
+        if len(same) >= info.max_voices:
+            voice = min(same, key=lambda voice: voice.started)
+            self.stats["stolen"] += 1
+        else:
+            voice = next((voice for voice in voices if voice.name is None), None)
+            if voice is None:
+                voice = min(voices, key=lambda voice: (voice.importance, voice.started))
+                if voice.importance > importance:
+                    self.stats["dropped"] += 1
+                    return
+                self.stats["stolen"] += 1
+
+        voice.channel.play(info.sound)
+        if x is not None:
+            right = min(max(x / self.width, 0.0), 1.0)
+            voice.channel.set_volume(1.0 - right * 0.5, 0.5 + right * 0.5)
+        voice.name = name
+        voice.importance = importance
+        voice.started = self.frame
+        self.stats["played"] += 1
+
+# Used when there is no mixer, e.g. headless runs: nothing is queued or played
+class NullSoundManager:
+    listener_x = 0
+    stats = {"played": 0, "coalesced": 0, "stolen": 0, "dropped": 0}
+
+    def register(self, name, sound, group, max_voices=2, priority=1):
+        pass
+
+    def play(self, name, x=None):
+        pass
+
+    def flush(self):
+        pass
+
+NULL_SOUND_MANAGER = NullSoundManager()
@@ -0,0 +1,160 @@
+# Batch runner for balance sweeps. Spreads headless games over a process
+# pool: every game gets its own parameter set, seed and input policy, and
+# each finished game is appended to a CSV file as soon as it comes back.
+# Later sweeps with the same parameters append to the same file.
+#
+#   python batch.py --param ENEMY_SPAWN_RATE=60,90,120 --param PLAYER_COOLDOWN=10,20 --seeds 50
+#
+# Workers import main once, preload the images once and never touch the
+# display or the mixer.
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import main
+
+# Knobs a sweep may change. All but PLAYER_COOLDOWN are main.py globals
+TUNABLES = {
+    "ENEMY_SPAWN_RATE": main.ENEMY_SPAWN_RATE,
+    "METEOR_SPAWN_RATE": main.METEOR_SPAWN_RATE,
+    "PLAYER_VELOCITY": main.PLAYER_VELOCITY,
+    "LASER_VELOCITY": main.LASER_VELOCITY,
+    "ENEMY_VELOCITY": main.ENEMY_VELOCITY,
+    "METEOR_VELOCITY": main.METEOR_VELOCITY,
+    "ENEMY_LASER_VELOCITY": main.ENEMY_LASER_VELOCITY,
+    "PLAYER_COOLDOWN": main.Player.COOLDOWN,
+}
+DEFAULT_MAX_TICKS = 30 * 60 * main.TICKS_PER_SECOND
+RESULTS_FILE = "batch_results.csv"
+
+def idle_policy(state):
+    return 0
+
+# Hold fire and sweep across the screen and back
+def sweep_policy(state):
+    direction = main.INPUT_RIGHT if (state.ticks // 120) % 2 == 0 else main.INPUT_LEFT
+    return main.INPUT_FIRE | direction
+
+POLICIES = {
+    "random": main.random_policy,
+    "idle": idle_policy,
+    "sweep": sweep_policy,
+}
+
+def init_worker():
+    main.assets.preload()
+
+def run_game(task):
+    params, seed, policy_name, max_ticks, vectorized = task
+    for name, default in TUNABLES.items():
+        if name != "PLAYER_COOLDOWN":
+            setattr(main, name, params.get(name, default))
+
+    policy = POLICIES[policy_name]
+    state = main.GameState(vectorized=vectorized, seed=seed)
+    state.player.COOLDOWN = params.get("PLAYER_COOLDOWN", TUNABLES["PLAYER_COOLDOWN"])
+
+    start = time.perf_counter()
+    while not state.game_over and state.ticks < max_ticks:
+        main.step(state, policy(state))
+    elapsed = time.perf_counter() - start
+
+    result = dict(params)
+    result.update({
+        "seed": seed,
+        "policy": policy_name,
+        "survival_ticks": state.ticks,
+        "survival_seconds": state.ticks / main.TICKS_PER_SECOND,
+        "survived": not state.game_over,
+        "score": state.player.score,
+        "ticks_per_sec": state.ticks / max(elapsed, 1e-9),
+    })
+    for stats in state.pool_stats():
+        result["peak_" + stats["name"]] = stats["high_water"]
+    return result
+
+# "NAME=1,2,3" -> ("NAME", [1, 2, 3])
+def parse_param(text):
+    name, _, values = text.partition("=")
+    name = name.strip().upper()
+    if name not in TUNABLES:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name}; choose from {', '.join(TUNABLES)}")
+    try:
+        return name, [int(value) for value in values.split(",") if value.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"values for {name} must be integers")
+
+def make_tasks(sweep, seeds, first_seed, policies, max_ticks, vectorized):
+    names = [name for name, _ in sweep]
+    for values in itertools.product(*(values for _, values in sweep)):
+        params = dict(zip(names, values))
+        for policy in policies:
+            for seed in range(first_seed, first_seed + seeds):
+                yield (params, seed, policy, max_ticks, vectorized)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run headless Galaxy Shooter games in parallel")
+    parser.add_argument("--param", type=parse_param, action="append", default=[],
+                        metavar="NAME=V1,V2", help="parameter values to sweep (repeatable)")
+    parser.add_argument("--seeds", type=int, default=10,
+                        help="games per parameter set and policy")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--policy", choices=list(POLICIES), action="append",
+                        help="input policy (repeatable, default: random)")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS,
+                        help="stop a game that survives this long")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="run games on the NumPy array engine")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--output", default=RESULTS_FILE,
+                        help="CSV file the results are appended to")
+    return parser.parse_args()
+
+# Header of an existing results file, or None when there is none yet
+def existing_columns(path):
+    try:
+        with open(path, newline="") as file:
+            return next(csv.reader(file), None)
+    except FileNotFoundError:
+        return None
+
+def main_cli():
+    args = parse_args()
+    tasks = list(make_tasks(args.param, args.seeds, args.first_seed, args.policy or ["random"],
+                            args.max_ticks, args.vectorized))
+    columns = [name for name, _ in args.param] + [
+        "seed", "policy", "survival_ticks", "survival_seconds", "survived", "score", "ticks_per_sec",
+        "peak_player_lasers", "peak_enemy_lasers", "peak_enemies", "peak_meteors", "peak_explosions"]
+
+    header = existing_columns(args.output)
+    if header is not None and header != columns:
+        sys.exit(f"{args.output} holds results with different columns; pick another --output")
+
+    start = time.perf_counter()
+    total_ticks = 0
+    with open(args.output, "a", newline="") as file, \
+            ProcessPoolExecutor(args.workers, initializer=init_worker) as executor:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        if header is None:
+            writer.writeheader()
+        futures = [executor.submit(run_game, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            writer.writerow(result)
+            file.flush()
+            total_ticks += result["survival_ticks"]
+            print(f"\r{done}/{len(tasks)} games", end="", flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(tasks)} games, {total_ticks} ticks in {elapsed:.1f}s "
+          f"({total_ticks / max(elapsed, 1e-9):.0f} ticks/s over {args.workers} workers) -> {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
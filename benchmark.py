@@ -0,0 +1,239 @@
+# Headless benchmark suite. Each scenario scripts the normal game loop
+# (GameState/step with the regular Player, Enemy, Meteor, Laser and
+# Explosion classes) into a known stress pattern, then reports ticks per
+# second, per-phase timings and peak memory. Results can be saved as a
+# baseline (one per engine) and later runs fail when they regress past
+# the tolerance. Any run fails when memory keeps growing once the pools
+# are warm.
+#
+#   python benchmark.py --save-baseline
+#   python benchmark.py                   # compare against the baseline
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import main
+from profiler import FrameProfiler
+
+# One baseline per engine; their speeds are not comparable
+BASELINE_FILES = {False: "benchmark_baseline.json", True: "benchmark_baseline_vectorized.json"}
+DEFAULT_TOLERANCE = 0.20  # Fail when 20% slower or bigger than the baseline
+MAX_MEMORY_GROWTH_KB = 128  # Fail when the second half grows more than this
+SEED = 1234
+
+# Keep the player alive so a scenario always runs its full length
+def keep_alive(state):
+    state.player.lives = main.MAX_LIVES
+
+# Top up a pool to `count` entities spawned in rows above the play area
+def fill(pool, count, asset, rng):
+    while len(pool) < count:
+        if pool.acquire(rng.randint(0, main.WIDTH - asset.width), rng.randint(-300, -asset.height), asset) is None:
+            break
+
+def enemy_barrage(count):
+    def tick(state):
+        keep_alive(state)
+        fill(state.enemies, count, main.get_asset("enemy"), state.random)
+        for enemy in state.enemies:
+            enemy.shoot(state.enemy_lasers)  # Fires whenever its cooldown allows
+        return 0
+    return tick
+
+def meteor_storm(count):
+    def tick(state):
+        keep_alive(state)
+        fill(state.meteors, count, main.get_asset("meteor"), state.random)
+        return 0
+    return tick
+
+def max_fire(targets):
+    def tick(state):
+        keep_alive(state)
+        state.player.COOLDOWN = 1  # Shoot every tick
+        fill(state.enemies, targets, main.get_asset("enemy"), state.random)
+        fill(state.meteors, targets, main.get_asset("meteor"), state.random)
+        return main.random_policy(state)  # Always holds fire
+    return tick
+
+def long_session():
+    def tick(state):
+        keep_alive(state)
+        return main.random_policy(state)
+    return tick
+
+# Scenarios that spawn from a wave file instead of topping up pools
+WAVE_FILES = {"wave_stress": "assets/waves/stress.json"}
+
+# name -> (ticks, tick function factory)
+SCENARIOS = {
+    "enemy_barrage": (3000, lambda: enemy_barrage(200)),
+    "meteor_storm": (3000, lambda: meteor_storm(200)),
+    "max_fire": (3000, lambda: max_fire(60)),
+    "long_session": (30 * 60 * main.TICKS_PER_SECOND, long_session),
+    "wave_stress": (3000, long_session),
+}
+QUICK_TICKS = 600  # Ticks per scenario with --quick
+
+def start_scenario(name, vectorized=False):
+    state = main.GameState(vectorized=vectorized, seed=SEED, waves_path=WAVE_FILES.get(name))
+    return state, SCENARIOS[name][1]()
+
+def run_ticks(state, tick, ticks, profiler=None):
+    if profiler is None:
+        for _ in range(ticks):
+            main.step(state, tick(state))
+        return
+    state.profiler = profiler
+    for _ in range(ticks):
+        inputs = tick(state)
+        profiler.begin_frame()
+        main.step(state, inputs)
+        main.count_entities(profiler, state)
+        profiler.end_frame()
+
+# Timing pass with the profiler, then a tracemalloc pass for memory. The
+# memory pass also reports how much the traced memory grew over the
+# second half of the run, which should stay near zero once pools are warm
+def measure(name, ticks, vectorized=False, memory=True):
+    profiler = FrameProfiler(history=ticks)
+    state, tick = start_scenario(name, vectorized)
+    start = time.perf_counter()
+    run_ticks(state, tick, ticks, profiler)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "ticks": ticks,
+        "vectorized": vectorized,
+        "ticks_per_sec": ticks / elapsed,
+        "score": state.player.score,
+        "peak_entities": {stats["name"]: stats["high_water"] for stats in state.pool_stats()},
+        "phases_ms": {},
+    }
+    for scope in profiler.scope_names:
+        p50, p95, p99, worst = profiler.percentiles(scope)
+        result["phases_ms"][scope] = {"p50": p50, "p95": p95, "p99": p99, "worst": worst}
+
+    if memory:
+        tracemalloc.start()
+        state, tick = start_scenario(name, vectorized)
+        run_ticks(state, tick, ticks // 2)
+        midway, _ = tracemalloc.get_traced_memory()
+        run_ticks(state, tick, ticks - ticks // 2)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_memory_kb"] = peak / 1024
+        result["memory_growth_kb"] = (current - midway) / 1024
+    return result
+
+# Memory that kept growing once the pools were warm
+def leaks(results, max_growth_kb):
+    return [f"{name}: memory grew {result['memory_growth_kb']:.0f} KB over the second half "
+            f"(limit {max_growth_kb:.0f} KB)"
+            for name, result in results.items()
+            if result.get("memory_growth_kb", 0) > max_growth_kb]
+
+# (failures, skipped) where skipped lists the scenarios the baseline
+# can't be compared with, and why
+def compare(results, baseline, tolerance):
+    failures = []
+    skipped = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            skipped.append(f"{name}: not in the baseline")
+            continue
+        if base.get("vectorized", False) != result["vectorized"]:
+            skipped.append(f"{name}: baseline is from the other engine")
+            continue
+        if base.get("ticks") != result["ticks"]:
+            skipped.append(f"{name}: baseline ran {base.get('ticks')} ticks, this run {result['ticks']}")
+            continue
+        if result["ticks_per_sec"] < base["ticks_per_sec"] * (1 - tolerance):
+            failures.append(f"{name}: {result['ticks_per_sec']:.0f} ticks/s, baseline {base['ticks_per_sec']:.0f}")
+        if "peak_memory_kb" in result and "peak_memory_kb" in base:
+            if result["peak_memory_kb"] > base["peak_memory_kb"] * (1 + tolerance):
+                failures.append(f"{name}: peak memory {result['peak_memory_kb']:.0f} KB, "
+                                f"baseline {base['peak_memory_kb']:.0f} KB")
+    return failures, skipped
+
+def print_result(name, result):
+    line = f"{name:<14} {result['ticks_per_sec']:9.0f} ticks/s"
+    if "peak_memory_kb" in result:
+        line += f"  peak {result['peak_memory_kb']:8.0f} KB  growth {result['memory_growth_kb']:7.0f} KB"
+    print(line)
+    for scope, timings in result["phases_ms"].items():
+        print(f"    {scope:<11} p50 {timings['p50']:6.3f}  p95 {timings['p95']:6.3f}  "
+              f"p99 {timings['p99']:6.3f}  worst {timings['worst']:6.3f} ms")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Galaxy Shooter benchmarks")
+    parser.add_argument("scenarios", nargs="*",
+                        help="scenarios to run: " + ", ".join(SCENARIOS) + " (default: all)")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"run every scenario for {QUICK_TICKS} ticks")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="run on the NumPy array engine")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=None,
+                        help="baseline file to compare against or save to "
+                             f"(default: {BASELINE_FILES[False]}, or {BASELINE_FILES[True]} with --vectorized)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown or memory growth as a fraction")
+    parser.add_argument("--max-growth", type=float, default=MAX_MEMORY_GROWTH_KB,
+                        help="fail when memory grows more than this many KB over a run's second half")
+    parser.add_argument("--output", default=None,
+                        help="also write the results to this JSON file")
+    return parser.parse_args()
+
+def main_cli():
+    args = parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"unknown scenario: {', '.join(unknown)}")
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        ticks = QUICK_TICKS if args.quick else SCENARIOS[name][0]
+        results[name] = measure(name, ticks, args.vectorized, not args.no_memory)
+        print_result(name, results[name])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    baseline_path = args.baseline or BASELINE_FILES[args.vectorized]
+    failures = leaks(results, args.max_growth)
+    if args.save_baseline:
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    else:
+        try:
+            with open(baseline_path) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        else:
+            regressions, skipped = compare(results, baseline, args.tolerance)
+            failures += regressions
+            if skipped:
+                print("Not compared with the baseline:")
+                for reason in skipped:
+                    print("  " + reason)
+            if len(skipped) == len(results):
+                failures.append(f"nothing was compared: no scenario matches {baseline_path}")
+
+    if failures:
+        print("REGRESSIONS:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("No regressions")
+
+if __name__ == "__main__":
+    main_cli()
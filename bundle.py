@@ -0,0 +1,107 @@
+# Packed asset bundle. Images are stored pre-decoded as zlib-compressed
+# RGBA pixels so loading them is a decompress instead of a PNG decode,
+# and sounds are stored as their original file bytes. The file is memory
+# mapped, and zlib releases the GIL, so entries can be unpacked on a
+# thread pool.
+#
+# Layout: MAGIC, a u32 index length, a JSON index, then the data blob.
+# The index is {"images": {name: entry}, "sounds": {name: entry}} where an
+# entry is {"offset", "size", "source"} plus "width"/"height" for images;
+# offsets are relative to the start of the blob and "source" is the
+# [size, mtime_ns] stamp of the file the entry was built from, so entries
+# whose file has changed since can be told apart.
+import json
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"GSPK0001"
+INDEX_LENGTH = struct.Struct("<I")
+COMPRESSION_LEVEL = 6
+
+# [size, mtime_ns] of a file, or None if it can't be read
+def file_stamp(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_size, info.st_mtime_ns]
+
+# `images` maps a name to (width, height, RGBA bytes, source stamp) and
+# `sounds` maps a name to (raw file bytes, source stamp)
+def write_bundle(path, images, sounds):
+    index = {"images": {}, "sounds": {}}
+    blobs = []
+    offset = 0
+    for name, (width, height, pixels, stamp) in images.items():
+        data = zlib.compress(pixels, COMPRESSION_LEVEL)
+        index["images"][name] = {"offset": offset, "size": len(data), "source": stamp,
+                                 "width": width, "height": height}
+        blobs.append(data)
+        offset += len(data)
+    for name, (data, stamp) in sounds.items():
+        index["sounds"][name] = {"offset": offset, "size": len(data), "source": stamp}
+        blobs.append(data)
+        offset += len(data)
+
+    header = json.dumps(index).encode("utf-8")
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(INDEX_LENGTH.pack(len(header)))
+        file.write(header)
+        for data in blobs:
+            file.write(data)
+
+class BundleReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            self.file.close()
+            raise ValueError(f"{path} is not an asset bundle")
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an asset bundle")
+        start = len(MAGIC)
+        (length,) = INDEX_LENGTH.unpack_from(self.data, start)
+        start += INDEX_LENGTH.size
+        index = json.loads(bytes(self.data[start:start + length]).decode("utf-8"))
+        self.images = index["images"]
+        self.sounds = index["sounds"]
+        self.blob_start = start + length
+
+    def has_image(self, name):
+        return name in self.images
+
+    def has_sound(self, name):
+        return name in self.sounds
+
+    # Whether an entry was built from an older or newer version of the file
+    # at `path`. A missing file isn't stale: the bundle is all there is
+    def image_stale(self, name, path):
+        return self._stale(self.images[name], path)
+
+    def sound_stale(self, name, path):
+        return self._stale(self.sounds[name], path)
+
+    def _stale(self, entry, path):
+        stamp = file_stamp(path)
+        return stamp is not None and entry.get("source") != stamp
+
+    def _raw(self, entry):
+        start = self.blob_start + entry["offset"]
+        return self.data[start:start + entry["size"]]
+
+    # (width, height, RGBA bytes) for an image entry
+    def read_image(self, name):
+        entry = self.images[name]
+        return entry["width"], entry["height"], zlib.decompress(self._raw(entry))
+
+    def read_sound(self, name):
+        return self._raw(self.sounds[name])
+
+    def close(self):
+        self.data.close()
+        self.file.close()
@@ -0,0 +1,99 @@
+# Structure-of-arrays storage and batched kernels for the vectorized engine.
+# Needs NumPy; main.py falls back to the per-object engine without it.
+import numpy as np
+
+# Every field is one contiguous array indexed by the entity's pool slot
+FIELDS = ("x", "y", "prev_x", "prev_y", "width", "height", "cooldown", "uid", "owner", "fire_odds")
+
+class EntityArrays:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.next_uid = 1
+        for name in FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=np.int64))
+
+    # Claim the next free row. Rows stay packed, matching the pool's order
+    def add(self):
+        row = self.count
+        self.count += 1
+        self.uid[row] = self.next_uid
+        self.next_uid += 1
+        self.owner[row] = 0
+        self.cooldown[row] = 0
+        return row
+
+    # Move the last row into the gap, the same way the pool compacts
+    def remove(self, row):
+        last = self.count - 1
+        if row != last:
+            for name in FIELDS:
+                column = getattr(self, name)
+                column[row] = column[last]
+        self.count = last
+
+# Advance every entity by the same vertical velocity
+def integrate(arrays, velocity):
+    n = arrays.count
+    arrays.prev_x[:n] = arrays.x[:n]
+    arrays.prev_y[:n] = arrays.y[:n]
+    arrays.y[:n] += velocity
+
+# Draw positions between the previous and current tick, as Python lists
+def lerp(arrays, alpha):
+    n = arrays.count
+    prev_x = arrays.prev_x[:n]
+    prev_y = arrays.prev_y[:n]
+    return ((prev_x + (arrays.x[:n] - prev_x) * alpha).tolist(),
+            (prev_y + (arrays.y[:n] - prev_y) * alpha).tolist())
+
+# Same test as Laser.off_screen
+def off_screen(arrays, height):
+    y = arrays.y[:arrays.count]
+    return (y < 0) | (y > height)
+
+# Entities whose bottom edge has passed the given line
+def below(arrays, height):
+    n = arrays.count
+    return arrays.y[:n] + arrays.height[:n] > height
+
+# Same counter logic as the classes' cooldown() methods
+def tick_cooldowns(arrays, cooldown):
+    counter = arrays.cooldown[:arrays.count]
+    running = counter > 0
+    counter[running] += 1
+    counter[counter > cooldown] = 0
+
+# Lasers whose owner is no longer alive in the owners' arrays
+def orphaned(lasers, owners):
+    owner = lasers.owner[:lasers.count]
+    return (owner != 0) & ~np.isin(owner, owners.uid[:owners.count])
+
+# One random fire roll per entity between 0 and its fire_odds, true where
+# the roll hits `target`. Entities with fire_odds 0 never fire
+def fire_rolls(rng, arrays, target=1):
+    odds = arrays.fire_odds[:arrays.count]
+    return (rng.integers(0, odds + 1) == target) & (odds > 0)
+
+# Bounding box test of every entity against one (left, top, right, bottom) box
+def overlaps_box(arrays, box):
+    n = arrays.count
+    left, top, right, bottom = box
+    x = arrays.x[:n]
+    y = arrays.y[:n]
+    return ((x < right) & (left < x + arrays.width[:n])
+            & (y < bottom) & (top < y + arrays.height[:n]))
+
+# All (a, b) row pairs whose bounding boxes overlap, ordered by a then b
+def overlap_pairs(a, b):
+    n, m = a.count, b.count
+    if n == 0 or m == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    ax = a.x[:n, None]
+    ay = a.y[:n, None]
+    bx = b.x[None, :m]
+    by = b.y[None, :m]
+    hits = ((ax < bx + b.width[None, :m]) & (bx < ax + a.width[:n, None])
+            & (ay < by + b.height[None, :m]) & (by < ay + a.height[:n, None]))
+    return np.nonzero(hits)
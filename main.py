@@ -2,36 +2,253 @@ import pygame
 import random
 import sys
 import os
-
-# Initialize pygame and set up screen
-pygame.init()
+import time
+import argparse
+import hashlib
+import io
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import audio
+import bundle
+import replay
+import scores
+import waves
+from profiler import FrameProfiler, NULL_PROFILER
+
+try:
+    import engine  # NumPy structure-of-arrays engine, optional
+except ImportError:
+    engine = None
+
+STARTUP_BEGIN = time.perf_counter()
+
+# Screen size. The window itself is only created by init_display() so the
+# simulation can run headless (no display, no sound)
 WIDTH, HEIGHT = 800, 700 
 GAME_HEIGHT = 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Galaxy Shooter")
-
-# Images
-player_img = pygame.image.load("assets/images/player.png")
-enemy_img = pygame.image.load("assets/images/enemy.png")
-meteor_img = pygame.image.load("assets/images/meteor.png")
-player_laser_img = pygame.image.load("assets/images/player_laser.png")
-enemy_laser_img = pygame.image.load("assets/images/enemy_laser.png")
-background_img = pygame.image.load("assets/images/background.png")
-life_icon_img = pygame.image.load("assets/ui/life_icon.png")
-life_lost_icon_img = pygame.image.load("assets/ui/life_lost_icon.png")
-explosion_img = pygame.image.load("assets/animations/explosion.png")
-
-# Player damaged images
-damage_imgs = [
-    pygame.image.load("assets/animations/damage1.png"),
-    pygame.image.load("assets/animations/damage2.png"),
-    pygame.image.load("assets/animations/damage3.png")
-]
-
-# Load sounds
-pygame.mixer.music.load("assets/sounds/background_music.mp3")
-shoot_sound = pygame.mixer.Sound("assets/sounds/shoot.wav")
-explosion_sound = pygame.mixer.Sound("assets/sounds/explosion.mp3")
+screen = None
+
+# Image files, loaded lazily through the asset registry below
+IMAGE_FILES = {
+    "player": "assets/images/player.png",
+    "enemy": "assets/images/enemy.png",
+    "meteor": "assets/images/meteor.png",
+    "player_laser": "assets/images/player_laser.png",
+    "enemy_laser": "assets/images/enemy_laser.png",
+    "background": "assets/images/background.png",
+    "life_icon": "assets/UI/life_icon.png",
+    "life_lost_icon": "assets/UI/life_lost_icon.png",
+    "explosion": "assets/animations/explosion.png",
+    # Player damaged images
+    "damage1": "assets/animations/damage1.png",
+    "damage2": "assets/animations/damage2.png",
+    "damage3": "assets/animations/damage3.png",
+}
+OPAQUE_IMAGES = {"background"}  # Converted without per-pixel alpha
+DAMAGE_FRAMES = ("damage1", "damage2", "damage3")
+
+# Sounds are optional: a missing file just means silence
+SOUND_FILES = {
+    "shoot": "assets/sounds/shoot.wav",
+    "explosion": "assets/sounds/explosion.mp3",
+    "music": "assets/sounds/background_music.mp3",
+}
+
+# Everything above packed into one file by --build-bundle. When it exists
+# it is used instead of the loose files
+BUNDLE_FILE = "assets/bundle.pak"
+LOADER_THREADS = 4
+PLACEHOLDER_SIZE = (32, 32)
+PLACEHOLDER_COLOR = (255, 0, 255)
+
+# One loaded image plus everything entities need from it. Entities keep a
+# reference to this instead of building their own mask
+class Asset:
+    def __init__(self, name, image):
+        self.name = name
+        self.image = image
+        self.width, self.height = image.get_size()
+        self.rect = image.get_rect()
+        self._mask = None
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = pygame.mask.from_surface(self.image)
+        return self._mask
+
+# Loads each image once, either on first use or all together on a thread
+# pool with preload(), and converts it to the display format when a window
+# exists. Images come from the bundle when there is one, otherwise from
+# the loose files. A missing image is replaced by a placeholder and listed
+# in `missing`. load_times records how long each image took to be ready,
+# counted from the start of preload() for preloaded ones
+class AssetRegistry:
+    def __init__(self, files, sound_files, bundle_path=BUNDLE_FILE):
+        self.files = files
+        self.sound_files = sound_files
+        self.bundle_path = bundle_path
+        self.bundle = None
+        self.bundle_checked = False
+        self.assets = {}
+        self.load_times = {}
+        self.missing = []
+        self.stale = []  # Bundle entries skipped because their file changed
+
+    def get(self, name):
+        asset = self.assets.get(name)
+        if asset is None:
+            start = time.perf_counter()
+            asset = self._finish(name, self._decode(name), start)
+        return asset
+
+    def _open_bundle(self):
+        if not self.bundle_checked:
+            self.bundle_checked = True
+            if os.path.exists(self.bundle_path):
+                try:
+                    self.bundle = bundle.BundleReader(self.bundle_path)
+                except ValueError as error:
+                    print(f"Ignoring asset bundle: {error}")
+        return self.bundle
+
+    # The slow part of a load, safe to run on a worker thread. Returns a
+    # surface, (width, height, RGBA bytes) from the bundle, or None
+    def _decode(self, name):
+        source = self._open_bundle()
+        if source is not None and source.has_image(name):
+            if not source.image_stale(name, self.files[name]):
+                return source.read_image(name)
+            self.stale.append(name)
+        try:
+            return pygame.image.load(self.files[name])
+        except (FileNotFoundError, pygame.error):
+            return None
+
+    # Surface creation, conversion and masks stay on the main thread
+    def _finish(self, name, decoded, start):
+        if decoded is None:
+            self.missing.append(name)
+            image = pygame.Surface(PLACEHOLDER_SIZE, pygame.SRCALPHA)
+            image.fill(PLACEHOLDER_COLOR)
+        elif isinstance(decoded, tuple):
+            width, height, pixels = decoded
+            image = pygame.image.frombytes(pixels, (width, height), "RGBA")
+        else:
+            image = decoded
+        asset = Asset(name, self._convert(name, image))
+        if name not in OPAQUE_IMAGES:
+            asset.mask  # Build the collision mask up front
+        self.assets[name] = asset
+        self.load_times[name] = time.perf_counter() - start
+        return asset
+
+    def _convert(self, name, image):
+        if pygame.display.get_init() and pygame.display.get_surface() is not None:
+            if name in OPAQUE_IMAGES:
+                return image.convert()
+            return image.convert_alpha()
+        return image
+
+    # Load every image not loaded yet, decoding on a thread pool. progress
+    # is called as progress(done, total) on this thread after each one
+    def preload(self, workers=LOADER_THREADS, progress=None):
+        names = [name for name in self.files if name not in self.assets]
+        self._open_bundle()  # Open once here rather than racing in the workers
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as executor:
+            futures = {executor.submit(self._decode, name): name for name in names}
+            for done, future in enumerate(as_completed(futures), 1):
+                self._finish(futures[future], future.result(), start)
+                if progress is not None:
+                    progress(done, len(names))
+
+    # Convert images that were loaded before the window was created
+    def convert_loaded(self):
+        for name, asset in self.assets.items():
+            asset.image = self._convert(name, asset.image)
+
+    # A mixer Sound, or None when the sound or the mixer is missing
+    def sound(self, name):
+        data = self._sound_data(name)
+        if data is None:
+            return None
+        try:
+            return pygame.mixer.Sound(file=data)
+        except pygame.error:
+            self.missing.append(name)
+            return None
+
+    # Start the looping music if there is any. Returns whether it started
+    def play_music(self, name="music"):
+        data = self._sound_data(name)
+        if data is None:
+            return False
+        try:
+            pygame.mixer.music.load(data, os.path.basename(self.sound_files[name]))
+            pygame.mixer.music.play(-1)
+        except pygame.error:
+            self.missing.append(name)
+            return False
+        return True
+
+    def _sound_data(self, name):
+        source = self._open_bundle()
+        path = self.sound_files[name]
+        if source is not None and source.has_sound(name):
+            if not source.sound_stale(name, path):
+                return io.BytesIO(source.read_sound(name))
+            self.stale.append(name)
+        if not os.path.exists(path):
+            self.missing.append(name)
+            return None
+        return path
+
+    def report(self):
+        source = self.bundle_path if self._open_bundle() is not None else "loose files"
+        lines = [f"{name}: {seconds * 1000:.2f} ms" for name, seconds in self.load_times.items()]
+        lines.append(f"{len(self.load_times)} images from {source}")
+        if self.stale:
+            lines.append(f"changed since {self.bundle_path} was built (loaded from files): "
+                         f"{', '.join(self.stale)}; rebuild it with --build-bundle")
+        if self.missing:
+            lines.append(f"missing (using fallbacks): {', '.join(self.missing)}")
+        return "\n".join(lines)
+
+# Decode every image and write them, with the sounds that exist, into
+# one bundle file. Only the top-left corner of the background is ever on
+# screen, so it is cropped to the window
+def build_bundle(path=BUNDLE_FILE):
+    images = {}
+    for name, file in IMAGE_FILES.items():
+        image = pygame.image.load(file)
+        if name == "background":
+            image = image.subsurface((0, 0, min(image.get_width(), WIDTH), min(image.get_height(), HEIGHT)))
+        images[name] = (image.get_width(), image.get_height(), pygame.image.tobytes(image, "RGBA"),
+                        bundle.file_stamp(file))
+    sounds = {}
+    for name, file in SOUND_FILES.items():
+        if os.path.exists(file):
+            with open(file, "rb") as sound_file:
+                sounds[name] = (sound_file.read(), bundle.file_stamp(file))
+    bundle.write_bundle(path, images, sounds)
+    return len(images), len(sounds)
+
+assets = AssetRegistry(IMAGE_FILES, SOUND_FILES)
+
+def get_asset(name):
+    return assets.get(name)
+
+# Sound effects go through a mixing budget set up by init_audio(); until
+# then (and in headless runs) every sound is a no-op
+sound_manager = audio.NULL_SOUND_MANAGER
+
+# name -> (channel group, max voices, priority)
+SOUND_BUDGET = {
+    "shoot": ("weapons", 2, 1),
+    "explosion": ("explosions", 4, 2),
+}
 
 # Set up constants
 PLAYER_VELOCITY = 5
@@ -39,106 +256,349 @@ LASER_VELOCITY = 8
 ENEMY_VELOCITY = 2
 METEOR_VELOCITY = 4
 ENEMY_LASER_VELOCITY = 6
-ENEMY_SPAWN_RATE = 120
+ENEMY_SPAWN_RATE = 120  # Ticks between the default waves' spawns
 METEOR_SPAWN_RATE = 180
 MAX_LIVES = 3
 
-# Set up fonts
-font = pygame.font.SysFont("comicsans", 30)
-game_over_font = pygame.font.SysFont("comicsans", 60)
-
-# High score file
-HIGH_SCORE_FILE = "highscore.txt"
-
-# Load or initialize high score
-def load_high_score():
-    if os.path.exists(HIGH_SCORE_FILE):
-        with open(HIGH_SCORE_FILE, "r") as file:
+# Fixed simulation timestep. All velocities and counters above are per tick
+TICKS_PER_SECOND = 60
+TICK_TIME = 1.0 / TICKS_PER_SECOND
+MAX_FRAME_TIME = 0.25  # Clamp long frames so the simulation can't spiral
+RENDER_FPS = 120
+
+# Input bits for one simulation tick
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_FIRE = 16
+
+# Recordings store a state hash every this many ticks
+CHECKPOINT_INTERVAL = 300
+
+# Fonts and the frame renderer are created by init_display()
+font = None
+game_over_font = None
+overlay_font = None
+renderer = None
+
+# Time since startup at which each startup phase finished
+startup_times = {}
+
+def mark_startup(phase):
+    startup_times[phase] = time.perf_counter() - STARTUP_BEGIN
+
+def init_display():
+    global screen, font, game_over_font, overlay_font, renderer
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Galaxy Shooter")
+    font = pygame.font.SysFont("comicsans", 30)
+    game_over_font = pygame.font.SysFont("comicsans", 60)
+    overlay_font = pygame.font.SysFont("consolas,couriernew,monospace", 14)
+    mark_startup("window")
+
+    # Decode the images in the background while showing progress
+    assets.convert_loaded()
+    assets.preload(progress=draw_loading_screen)
+    mark_startup("images")
+    renderer = DirtyRectRenderer(screen, compose_background())
+
+def draw_loading_screen(done, total):
+    pygame.event.pump()  # Keep the window responsive
+    screen.fill((0, 0, 0))
+    label = labels.render(font, "Loading...", (255, 255, 255))
+    screen.blit(label, (WIDTH // 2 - label.get_width() // 2, HEIGHT // 2 - 40))
+    bar = pygame.Rect(WIDTH // 4, HEIGHT // 2, WIDTH // 2, 20)
+    pygame.draw.rect(screen, (255, 255, 255), bar, 2)
+    pygame.draw.rect(screen, (255, 255, 255), (bar.x, bar.y, bar.width * done // max(total, 1), bar.height))
+    pygame.display.update(bar.inflate(0, 100))
+
+# Returns whether the background music started
+def init_audio():
+    global sound_manager
+    if not pygame.mixer.get_init():
+        try:
+            pygame.mixer.init()
+        except pygame.error:
+            return False  # No audio device: play without sound
+    sound_manager = audio.SoundManager(audio.channel_groups(SOUND_BUDGET), WIDTH)
+    for name, (group, max_voices, priority) in SOUND_BUDGET.items():
+        sound_manager.register(name, assets.sound(name), group, max_voices, priority)
+    playing = assets.play_music()
+    mark_startup("audio")
+    return playing
+
+# Queue a sound effect; x is where on screen it happened
+def play_sound(name, x=None):
+    sound_manager.play(name, x)
+
+# Scores live in an append-only store with per player and mode
+# leaderboards, see scores.py. The old single high score file is
+# imported into it once
+SCORE_DIR = "scores"
+LEGACY_HIGH_SCORE_FILE = "highscore.txt"
+DEFAULT_PLAYER = "player"
+DEFAULT_MODE = "classic"
+GAME_OVER_SECONDS = 3
+LEADERBOARD_LINES = 5
+
+def open_score_store():
+    try:
+        store = scores.ScoreStore(SCORE_DIR)
+    except OSError as error:
+        print(f"Could not open scores in {SCORE_DIR}, they won't be saved: {error}", file=sys.stderr)
+        store = scores.MemoryScoreStore()
+    if store.empty:
+        score = read_legacy_high_score()
+        if score > 0:
+            store.submit(DEFAULT_PLAYER, DEFAULT_MODE, score, imported=True)
+    return store
+
+# Waits for pending writes. A score that could not be written is reported
+# rather than lost silently
+def close_score_store(store):
+    store.close()
+    if store.error is not None:
+        print(f"Could not save scores to {SCORE_DIR}: {store.error}", file=sys.stderr)
+
+# A missing or damaged file counts as no high score
+def read_legacy_high_score():
+    try:
+        with open(LEGACY_HIGH_SCORE_FILE, "r") as file:
             return int(file.read().strip())
-    else:
+    except (OSError, ValueError):
         return 0
 
-def save_high_score(score):
-    with open(HIGH_SCORE_FILE, "w") as file:
-        file.write(str(score))
+# Position of an object between its previous and current tick
+def lerp_pos(obj, alpha):
+    return (obj.prev_x + (obj.x - obj.prev_x) * alpha,
+            obj.prev_y + (obj.y - obj.prev_y) * alpha)
+
+# Pool sizes. A full pool drops new spawns/shots instead of allocating
+PLAYER_LASER_POOL_SIZE = 64
+ENEMY_LASER_POOL_SIZE = 512
+ENEMY_POOL_SIZE = 256
+METEOR_POOL_SIZE = 256
+EXPLOSION_POOL_SIZE = 128
+
+# Fixed-capacity pool of entity records. Live records are kept packed at
+# the front of `active` (release swaps the last one into the gap) and
+# released records go on a free list to be reused by the next acquire().
+# Records track their slot in `index` (-1 when free) and bump `serial`
+# every time they are reused, so stale references can be detected.
+# Releasing while iterating is safe when walking `reversed(pool)`
+class Pool:
+    def __init__(self, cls, capacity, name=None):
+        self.cls = cls
+        self.capacity = capacity
+        self.name = name or cls.__name__
+        self.active = []
+        self.free = []
+        self.allocated = 0
+        self.high_water = 0
+        self.dropped = 0
+
+    def acquire(self, *args):
+        if self.free:
+            item = self.free.pop()
+        elif self.allocated < self.capacity:
+            # Records are only ever set up through reset()
+            item = self.cls.__new__(self.cls)
+            item.serial = 0
+            self.allocated += 1
+        else:
+            self.dropped += 1
+            return None
+        item.index = len(self.active)
+        self.active.append(item)
+        self.attach(item)
+        item.reset(*args)
+        item.serial += 1
+        if len(self.active) > self.high_water:
+            self.high_water = len(self.active)
+        return item
+
+    # Hook for pools that keep per-slot data next to the records
+    def attach(self, item):
+        pass
+
+    def release(self, item):
+        index = item.index
+        if index < 0:
+            return
+        last = self.active.pop()
+        if last is not item:
+            self.active[index] = last
+            last.index = index
+        item.index = -1
+        self.free.append(item)
+
+    def __len__(self):
+        return len(self.active)
+
+    def __iter__(self):
+        return iter(self.active)
+
+    def __reversed__(self):
+        return reversed(self.active)
+
+    def __getitem__(self, index):
+        return self.active[index]
+
+    # (image, position) pairs for one Surface.blits batch, interpolated
+    # between the previous and current tick like lerp_pos
+    def sprites(self, alpha):
+        return [(item.img, (item.prev_x + (item.x - item.prev_x) * alpha,
+                            item.prev_y + (item.y - item.prev_y) * alpha))
+                for item in self.active]
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "active": len(self.active),
+            "capacity": self.capacity,
+            "allocated": self.allocated,
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+        }
 
 # Classes for Player, Enemy, Laser, Meteor, and Explosion
 class Laser:
-    def __init__(self, x, y, img):
-        self.x = x
-        self.y = y
-        self.img = img
-        self.mask = pygame.mask.from_surface(self.img)
-
-    def draw(self, window):
-        window.blit(self.img, (self.x, self.y))
+    __slots__ = ("x", "y", "prev_x", "prev_y", "asset", "img", "mask",
+                 "owner", "owner_serial", "index", "serial")
+
+    def __init__(self, x, y, asset, owner=None):
+        self.index = -1
+        self.serial = 0
+        self.reset(x, y, asset, owner)
+
+    def reset(self, x, y, asset, owner=None):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+        self.asset = asset
+        self.img = asset.image
+        self.mask = asset.mask
+        self.owner = owner
+        self.owner_serial = owner.serial if owner is not None else 0
+
+    # True once the enemy that fired this laser is gone
+    def orphaned(self):
+        owner = self.owner
+        return owner is not None and (owner.index < 0 or owner.serial != self.owner_serial)
 
     def move(self, velocity):
+        self.prev_y = self.y
         self.y += velocity
 
     def off_screen(self, height):
         return not (0 <= self.y <= height)
 
+    def get_width(self):
+        return self.asset.width
+
+    def get_height(self):
+        return self.asset.height
+
     def collision(self, obj):
         return collide(self, obj)
 
 class Player:
     COOLDOWN = 20  # frames between each laser shot
 
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    def __init__(self, x, y, lasers=None):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
         self.lives = MAX_LIVES
         self.score = 0
-        self.img = player_img
-        self.mask = pygame.mask.from_surface(self.img)
-        self.lasers = []
+        self.asset = get_asset("player")
+        self.img = self.asset.image
+        self.mask = self.asset.mask
+        self.lasers = lasers if lasers is not None else Pool(Laser, PLAYER_LASER_POOL_SIZE, "player_lasers")
         self.cool_down_counter = 0
         self.damage_counter = 0
         self.is_damaged = False
 
-    def draw(self, window):
-        window.blit(self.img, (self.x, self.y))
+    # Lasers are drawn with everyone else's, see draw_frame
+    def draw(self, renderer, alpha=1.0):
+        pos = lerp_pos(self, alpha)
+        renderer.blit(self.img, pos, LAYER_SHIPS)
 
         # Draw damage overlay if damaged
         if self.is_damaged:
-            damage_img = damage_imgs[self.damage_counter // 2]  # Cycle faster
-            window.blit(damage_img, (self.x, self.y))
+            damage_img = get_asset(DAMAGE_FRAMES[self.damage_counter // 2]).image  # Cycle faster
+            renderer.blit(damage_img, pos, LAYER_EFFECTS)
+
+    def move(self, inputs):
+        self.prev_x = self.x
+        self.prev_y = self.y
+        if inputs & INPUT_LEFT and self.x - PLAYER_VELOCITY > 0:
+            self.x -= PLAYER_VELOCITY
+        if inputs & INPUT_RIGHT and self.x + PLAYER_VELOCITY + self.get_width() < WIDTH:
+            self.x += PLAYER_VELOCITY
+        if inputs & INPUT_UP and self.y - PLAYER_VELOCITY > 0:
+            self.y -= PLAYER_VELOCITY
+        if inputs & INPUT_DOWN and self.y + PLAYER_VELOCITY + self.get_height() < GAME_HEIGHT:
+            self.y += PLAYER_VELOCITY
+        if inputs & INPUT_FIRE:
+            self.shoot()
+
+    # Advance the damage effect one tick
+    def update_damage(self):
+        if self.is_damaged:
             self.damage_counter += 1
             if self.damage_counter >= 6:  # Stop damage effect after cycling through images
                 self.is_damaged = False
                 self.damage_counter = 0
 
-        for laser in self.lasers:
-            laser.draw(window)
-
     # Update move_lasers to accept explosions as a parameter
-    def move_lasers(self, velocity, enemies, meteors, explosions):
+    def move_lasers(self, velocity, enemies, meteors, explosions, enemy_grid=None, meteor_grid=None):
         self.cooldown()
-        for laser in self.lasers[:]:  # Use slicing to avoid issues while removing items
+        if not self.lasers:
+            return
+
+        # Bucket targets so each laser only runs mask checks against nearby
+        # ones. With only a few pairs the plain pools are cheaper
+        use_grid = len(self.lasers) * (len(enemies) + len(meteors)) > BROAD_PHASE_MIN_PAIRS
+        if use_grid:
+            if enemy_grid is None:
+                enemy_grid = SpatialHash()
+            if meteor_grid is None:
+                meteor_grid = SpatialHash()
+            enemy_grid.rebuild(enemies)
+            meteor_grid.rebuild(meteors)
+
+        for laser in reversed(self.lasers):  # Walk backwards so released slots don't skip lasers
             laser.move(velocity)
             if laser.off_screen(GAME_HEIGHT):
-                self.lasers.remove(laser)
-            else:
-                for enemy in enemies[:]:  # Check collision with each enemy individually
-                    if laser.collision(enemy):
-                        explosion_sound.play()
-                        self.score += 10
-                        enemies.remove(enemy)
-                        explosions.append(Explosion(enemy.x, enemy.y))  # Append explosion to list
-                        if laser in self.lasers:
-                            self.lasers.remove(laser)
-                            break  # Stop checking after removing laser
-
-                # Check collision with meteors
-                for meteor in meteors[:]:
-                    if laser.collision(meteor):
-                        explosion_sound.play()
-                        meteors.remove(meteor)
-                        explosions.append(Explosion(meteor.x, meteor.y))  # Append explosion to list
-                        if laser in self.lasers:
-                            self.lasers.remove(laser)
-                            break  # Stop checking after removing laser
+                self.lasers.release(laser)
+                continue
+
+            nearby = enemy_grid.query(laser) if use_grid else enemies
+            for enemy in nearby:  # Check collision with each nearby enemy
+                if laser.collision(enemy):
+                    play_sound("explosion", enemy.x)
+                    self.score += 10
+                    if use_grid:
+                        enemy_grid.remove(enemy)
+                    enemies.release(enemy)
+                    explosions.acquire(enemy.x, enemy.y)
+                    self.lasers.release(laser)
+                    break  # Stop checking after removing laser
+            if laser.index < 0:
+                continue
+
+            # Check collision with meteors
+            nearby = meteor_grid.query(laser) if use_grid else meteors
+            for meteor in nearby:
+                if laser.collision(meteor):
+                    play_sound("explosion", meteor.x)
+                    if use_grid:
+                        meteor_grid.remove(meteor)
+                    meteors.release(meteor)
+                    explosions.acquire(meteor.x, meteor.y)
+                    self.lasers.release(laser)
+                    break  # Stop checking after removing laser
 
     def cooldown(self):
         if self.cool_down_counter >= self.COOLDOWN:
@@ -148,240 +608,1007 @@ class Player:
 
     def shoot(self):
         if self.cool_down_counter == 0:
-            laser = Laser(self.x + self.img.get_width() // 2 - player_laser_img.get_width() // 2, self.y, player_laser_img)
-            self.lasers.append(laser)
-            shoot_sound.play()
+            laser_asset = get_asset("player_laser")
+            if self.lasers.acquire(self.x + self.asset.width // 2 - laser_asset.width // 2, self.y, laser_asset):
+                play_sound("shoot", self.x)
             self.cool_down_counter = 1
 
     def take_damage(self, explosions):  # Add explosions parameter here if needed
         if not self.is_damaged:
             self.lives -= 1
             self.is_damaged = True
-            explosions.append(Explosion(self.x, self.y))
+            explosions.acquire(self.x, self.y)
 
     def get_width(self):
-        return self.img.get_width()
+        return self.asset.width
 
     def get_height(self):
-        return self.img.get_height()
+        return self.asset.height
 
 class Enemy:
     COOLDOWN = 60
-
-    def __init__(self, x, y, img):
-        self.x = x
-        self.y = y
-        self.img = img
-        self.mask = pygame.mask.from_surface(self.img)
-        self.lasers = []
+    __slots__ = ("x", "y", "prev_x", "prev_y", "asset", "img", "mask",
+                 "cool_down_counter", "fire_odds", "index", "serial")
+
+    def __init__(self, x, y, asset):
+        self.index = -1
+        self.serial = 0
+        self.reset(x, y, asset)
+
+    def reset(self, x, y, asset):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+        self.asset = asset
+        self.img = asset.image
+        self.mask = asset.mask
         self.cool_down_counter = 0
-
-    def draw(self, window):
-        window.blit(self.img, (self.x, self.y))
-        for laser in self.lasers:
-            laser.draw(window)
+        self.fire_odds = waves.FIRE_PATTERNS["normal"]  # Set by the wave that spawns it
 
     def move(self, velocity):
+        self.prev_y = self.y
         self.y += velocity
 
-    # Update move_lasers to accept explosions as a parameter
-    def move_lasers(self, velocity, player, explosions):  
-        self.cooldown()
-        for laser in self.lasers[:]:  # Use slicing to avoid issues while removing items
-            laser.move(velocity)
-            if laser.off_screen(GAME_HEIGHT):
-                self.lasers.remove(laser)
-            elif laser.collision(player):
-                player.take_damage(explosions)  # Pass explosions to take_damage
-                explosion_sound.play()
-                self.lasers.remove(laser)
-
     def cooldown(self):
         if self.cool_down_counter >= self.COOLDOWN:
             self.cool_down_counter = 0
         elif self.cool_down_counter > 0:
             self.cool_down_counter += 1
 
-    def shoot(self):
+    # Enemy lasers share one pool; each laser remembers who fired it
+    def shoot(self, lasers):
         if self.cool_down_counter == 0:
-            laser = Laser(self.x + self.img.get_width() // 2 - enemy_laser_img.get_width() // 2, self.y + self.img.get_height(), enemy_laser_img)
-            self.lasers.append(laser)
+            laser_asset = get_asset("enemy_laser")
+            lasers.acquire(self.x + self.asset.width // 2 - laser_asset.width // 2, self.y + self.asset.height, laser_asset, self)
             self.cool_down_counter = 1
 
     def get_width(self):
-        return self.img.get_width()
+        return self.asset.width
 
     def get_height(self):
-        return self.img.get_height()
+        return self.asset.height
+
+# Move every enemy laser and check it against the player. Lasers die with
+# the enemy that fired them
+def move_enemy_lasers(lasers, velocity, player, explosions):
+    for laser in reversed(lasers):
+        if laser.orphaned():
+            lasers.release(laser)
+            continue
+        laser.move(velocity)
+        if laser.off_screen(GAME_HEIGHT):
+            lasers.release(laser)
+        elif laser.collision(player):
+            player.take_damage(explosions)  # Pass explosions to take_damage
+            play_sound("explosion", player.x)
+            lasers.release(laser)
 
 class Meteor:
-    def __init__(self, x, y, img):
-        self.x = x
-        self.y = y
-        self.img = img
-        self.mask = pygame.mask.from_surface(self.img)
+    __slots__ = ("x", "y", "prev_x", "prev_y", "asset", "img", "mask", "index", "serial")
+
+    def __init__(self, x, y, asset):
+        self.index = -1
+        self.serial = 0
+        self.reset(x, y, asset)
 
-    def draw(self, window):
-        window.blit(self.img, (self.x, self.y))
+    def reset(self, x, y, asset):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+        self.asset = asset
+        self.img = asset.image
+        self.mask = asset.mask
 
     def move(self, velocity):
+        self.prev_y = self.y
         self.y += velocity
 
     def get_width(self):
-        return self.img.get_width()
+        return self.asset.width
 
     def get_height(self):
-        return self.img.get_height()
+        return self.asset.height
 
 # Define Explosion class to manage explosions
 class Explosion:
+    __slots__ = ("x", "y", "img", "timer", "index", "serial")
+
     def __init__(self, x, y):
+        self.index = -1
+        self.serial = 0
+        self.reset(x, y)
+
+    def reset(self, x, y):
         self.x = x
         self.y = y
-        self.img = explosion_img
+        self.img = get_asset("explosion").image
         self.timer = 6  # Adjust this for how long the explosion lasts
 
-    def draw(self, window):
-        window.blit(self.img, (self.x, self.y))
+    def update(self):
         self.timer -= 1
 
+# Vectorized engine: pools whose records are thin views over the NumPy
+# arrays in engine.py, so movement, culling, fire rolls and broad-phase
+# tests can run as batched array operations
+class ArrayPool(Pool):
+    def __init__(self, cls, capacity, name=None):
+        super().__init__(cls, capacity, name)
+        self.arrays = engine.EntityArrays(capacity)
+
+    def attach(self, item):
+        item.arrays = self.arrays
+        self.arrays.add()
+
+    def release(self, item):
+        if item.index >= 0:
+            self.arrays.remove(item.index)
+        super().release(item)
+
+    def sprites(self, alpha):
+        xs, ys = engine.lerp(self.arrays, alpha)
+        return list(zip([item.img for item in self.active], zip(xs, ys)))
+
+# Attribute backed by one column of the owning pool's arrays
+def array_field(name):
+    def get(self):
+        return int(getattr(self.arrays, name)[self.index])
+
+    def set(self, value):
+        getattr(self.arrays, name)[self.index] = value
+
+    return property(get, set)
+
+class LaserView(Laser):
+    __slots__ = ("arrays",)
+    x = array_field("x")
+    y = array_field("y")
+    prev_x = array_field("prev_x")
+    prev_y = array_field("prev_y")
+
+    def reset(self, x, y, asset, owner=None):
+        self.arrays.width[self.index] = asset.width
+        self.arrays.height[self.index] = asset.height
+        if owner is not None:
+            self.arrays.owner[self.index] = owner.arrays.uid[owner.index]
+        Laser.reset(self, x, y, asset, owner)
+
+class EnemyView(Enemy):
+    __slots__ = ("arrays",)
+    x = array_field("x")
+    y = array_field("y")
+    prev_x = array_field("prev_x")
+    prev_y = array_field("prev_y")
+    cool_down_counter = array_field("cooldown")
+    fire_odds = array_field("fire_odds")
+
+    def reset(self, x, y, asset):
+        self.arrays.width[self.index] = asset.width
+        self.arrays.height[self.index] = asset.height
+        Enemy.reset(self, x, y, asset)
+
+class MeteorView(Meteor):
+    __slots__ = ("arrays",)
+    x = array_field("x")
+    y = array_field("y")
+    prev_x = array_field("prev_x")
+    prev_y = array_field("prev_y")
+
+    def reset(self, x, y, asset):
+        self.arrays.width[self.index] = asset.width
+        self.arrays.height[self.index] = asset.height
+        Meteor.reset(self, x, y, asset)
+
 # Helper function for collisions
 def collide(obj1, obj2):
     offset_x = obj2.x - obj1.x
     offset_y = obj2.y - obj1.y
+
+    # Cheap bounding box rejection before the pixel mask test
+    width1, height1 = obj1.mask.get_size()
+    width2, height2 = obj2.mask.get_size()
+    if offset_x >= width1 or -offset_x >= width2 or offset_y >= height1 or -offset_y >= height2:
+        return False
+
     return obj1.mask.overlap(obj2.mask, (offset_x, offset_y)) != None
 
+# Uniform grid broad phase. Objects are bucketed into every cell their
+# bounding box touches, and query() returns the ones whose boxes overlap
+# the given object, in the order they were inserted
+GRID_CELL_SIZE = 128  # A bit larger than the biggest sprite
+BROAD_PHASE_MIN_PAIRS = 32  # Below this many laser/target pairs, skip the grid
+
+class SpatialHash:
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}  # obj -> (insert order, box, cell keys)
+
+    def _keys(self, left, top, right, bottom):
+        size = self.cell_size
+        x0, x1 = int(left) // size, int(right - 1) // size
+        y0, y1 = int(top) // size, int(bottom - 1) // size
+        if x0 == x1 and y0 == y1:
+            return ((x0, y0),)
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+
+    def rebuild(self, objs):
+        self.clear()
+        for obj in objs:
+            self.insert(obj)
+
+    def insert(self, obj):
+        width, height = obj.mask.get_size()
+        box = (obj.x, obj.y, obj.x + width, obj.y + height)
+        keys = self._keys(*box)
+        self.entries[obj] = (len(self.entries), box, keys)
+        cells = self.cells
+        for key in keys:
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [obj]
+            else:
+                cell.append(obj)
+
+    def remove(self, obj):
+        entry = self.entries.pop(obj, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            self.cells[key].remove(obj)
+
+    def query(self, obj):
+        if not self.entries:
+            return []
+        width, height = obj.mask.get_size()
+        left, top = obj.x, obj.y
+        right, bottom = left + width, top + height
+        entries = self.entries
+        found = []
+        for key in self._keys(left, top, right, bottom):
+            for other in self.cells.get(key, ()):
+                other_left, other_top, other_right, other_bottom = entries[other][1]
+                if (other_left < right and left < other_right
+                        and other_top < bottom and top < other_bottom
+                        and other not in found):
+                    found.append(other)
+        if len(found) > 1:
+            found.sort(key=lambda other: entries[other][0])
+        return found
+
+# Rendered text surfaces keyed by font, text and colour. The HUD values
+# rarely change, so most frames reuse the same few surfaces
+LABEL_CACHE_SIZE = 128
+
+class LabelCache:
+    def __init__(self, max_size=LABEL_CACHE_SIZE):
+        self.max_size = max_size
+        self.labels = {}
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        label = self.labels.pop(key, None)
+        if label is None:
+            self.misses += 1
+            label = font.render(text, 1, color)
+            if len(self.labels) >= self.max_size:
+                del self.labels[next(iter(self.labels))]  # Drop the least recently used
+        else:
+            self.hits += 1
+        self.labels[key] = label
+        return label
+
+labels = LabelCache()
+
+# Draw order, back to front. Each layer is a list of sprite batches.
+# Lasers go over ships so a new shot isn't hidden under its owner
+LAYER_SHIPS = 0
+LAYER_LASERS = 1
+LAYER_METEORS = 2
+LAYER_EFFECTS = 3
+LAYER_OVERLAY = 4
+LAYER_COUNT = 5
+
+# Only repaints what changed. Blits are queued into layers and submitted
+# at the end of the frame with one Surface.blits call per batch. Every
+# rect those calls return is recorded, the next frame erases those rects
+# by copying the background back, and only the old and new rects are
+# passed to display.update(). Entities are clipped to the play area, so
+# the status bar below it is redrawn only when its values change
+class DirtyRectRenderer:
+    def __init__(self, surface, background):
+        self.surface = surface
+        self.background = background
+        self.play_area = pygame.Rect(0, 0, WIDTH, GAME_HEIGHT)
+        self.status_area = pygame.Rect(0, GAME_HEIGHT, WIDTH, HEIGHT - GAME_HEIGHT)
+        self.layers = [[] for _ in range(LAYER_COUNT)]
+        self.previous = []
+        self.current = []
+        self.dirty = []
+        self.status_key = None
+        self.full_redraw = True
+
+    # Force the next frame to repaint the whole window
+    def invalidate(self):
+        self.full_redraw = True
+
+    def begin_frame(self):
+        self.dirty = []
+        if self.full_redraw:
+            self.surface.blit(self.background, (0, 0))
+            self.dirty.append(self.surface.get_rect())
+        else:
+            background = self.background
+            self.surface.blits([(background, rect, rect) for rect in self.previous], False)
+            self.dirty.extend(self.previous)
+        self.current = []
+
+    # Queue one image. Drawn when the frame ends, over everything in
+    # lower layers
+    def blit(self, image, pos, layer=LAYER_OVERLAY):
+        self.layers[layer].append(((image, pos),))
+
+    # Queue a whole sequence of (image, position) pairs, e.g. Pool.sprites()
+    def blits(self, sprites, layer):
+        if sprites:
+            self.layers[layer].append(sprites)
+
+    # Redraw the status bar if anything on it changed
+    def draw_status(self, key, draw):
+        self.surface.set_clip(None)
+        if key != self.status_key or self.full_redraw:
+            self.surface.blit(self.background, self.status_area, self.status_area)
+            draw()
+            self.dirty.append(self.status_area)
+            self.status_key = key
+
+    def end_frame(self):
+        surface = self.surface
+        current = self.current
+        surface.set_clip(self.play_area)
+        for layer in self.layers:
+            for batch in layer:
+                current.extend(rect for rect in surface.blits(batch) if rect)  # Skip fully clipped
+            layer.clear()
+        surface.set_clip(None)
+        self.dirty.extend(current)
+        self.previous = self.current
+        self.full_redraw = False
+        pygame.display.update(self.dirty)
+
 # Function for game over screen
-def game_over_screen(player, high_score):
-    screen.blit(background_img, (0, 0))
-    game_over_label = game_over_font.render("GAME OVER", 1, (255, 0, 0))
-    score_label = font.render(f"Score: {player.score}", 1, (255, 255, 255))
-    high_score_label = font.render(f"High Score: {high_score}", 1, (255, 255, 255))
+def game_over_screen(player, high_score, leaderboard=()):
+    screen.blit(get_asset("background").image, (0, 0))
+    game_over_label = labels.render(game_over_font, "GAME OVER", (255, 0, 0))
+    score_label = labels.render(font, f"Score: {player.score}", (255, 255, 255))
+    high_score_label = labels.render(font, f"High Score: {high_score}", (255, 255, 255))
     
     screen.blit(game_over_label, (WIDTH // 2 - game_over_label.get_width() // 2, HEIGHT // 2 - game_over_label.get_height() // 2))
     screen.blit(score_label, (WIDTH // 2 - score_label.get_width() // 2, HEIGHT // 2 + 50))
     screen.blit(high_score_label, (WIDTH // 2 - high_score_label.get_width() // 2, HEIGHT // 2 + 100))
+
+    for i, record in enumerate(leaderboard[:LEADERBOARD_LINES]):
+        line = labels.render(overlay_font, f"{i + 1}. {record['score']}", (200, 200, 200))
+        screen.blit(line, (WIDTH // 2 - line.get_width() // 2, HEIGHT // 2 + 150 + i * (line.get_height() + 4)))
     
     pygame.display.update()
-    pygame.time.delay(3000)
-    pygame.quit()
-    sys.exit()
 
-# Function to draw the status bar with lives and score
+# Keep the game over screen up for GAME_OVER_SECONDS, or until a key is
+# pressed, while the score is written in the background
+def show_game_over(player, high_score, leaderboard):
+    clock = pygame.time.Clock()
+    shown = 0.0
+    while shown < GAME_OVER_SECONDS:
+        for event in pygame.event.get():
+            if event.type in (pygame.QUIT, pygame.KEYDOWN):
+                return
+        game_over_screen(player, high_score, leaderboard)
+        shown += clock.tick(30) / 1000.0
+
+# The background cropped to the window with the status bar's fixed text
+# already drawn on it, in the display's pixel format. Everything static
+# is one opaque blit from here
+def compose_background():
+    background = pygame.Surface((WIDTH, HEIGHT)).convert()
+    background.blit(get_asset("background").image, (0, 0))
+    lives_label = labels.render(font, "Lives: ", (255, 255, 255))
+    background.blit(lives_label, (10, GAME_HEIGHT + 10))
+    return background
+
+# Function to draw the status bar with lives and score. "Lives: " is part
+# of the composed background
 def draw_status_bar(player, high_score):
-    lives_label = font.render("Lives: ", 1, (255, 255, 255))
-    score_label = font.render(f"Score: {player.score}", 1, (255, 255, 255))
-    high_score_label = font.render(f"High Score: {high_score}", 1, (255, 255, 255))
-    screen.blit(lives_label, (10, GAME_HEIGHT + 10))
+    lives_label = labels.render(font, "Lives: ", (255, 255, 255))
+    score_label = labels.render(font, f"Score: {player.score}", (255, 255, 255))
+    high_score_label = labels.render(font, f"High Score: {high_score}", (255, 255, 255))
     screen.blit(score_label, (WIDTH - score_label.get_width() - 10, GAME_HEIGHT + 10))
     screen.blit(high_score_label, (WIDTH // 2 - high_score_label.get_width() // 2, GAME_HEIGHT + 10))
 
     for i in range(MAX_LIVES):
-        icon = life_icon_img if i < player.lives else life_lost_icon_img
+        icon = get_asset("life_icon" if i < player.lives else "life_lost_icon").image
         screen.blit(icon, (10 + lives_label.get_width() + i * (icon.get_width() + 5), GAME_HEIGHT + 10))
 
+POLICY_SEED_SALT = 0x5DEECE66D  # Mixed into the seed for GameState.policy_random
+
+# Everything the simulation needs for one game. With vectorized=True the
+# entities live in NumPy arrays and step() uses the batched update. All
+# game randomness comes from the state's own generators, so the same seed
+# and inputs always play out the same game
+class GameState:
+    def __init__(self, high_score=0, vectorized=False, seed=None, waves_path=None):
+        if vectorized and engine is None:
+            raise RuntimeError("the vectorized engine needs NumPy")
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed % (1 << 64)  # Recordings store it as an unsigned 64-bit value
+        self.random = random.Random(self.seed)
+        # Separate stream for scripted input policies, so the same seed
+        # fixes their inputs too without them shifting the game's stream
+        self.policy_random = random.Random(self.seed ^ POLICY_SEED_SALT)
+        self.vectorized = vectorized
+        self.high_score = high_score
+        if vectorized:
+            self.player = Player(300, 500, ArrayPool(LaserView, PLAYER_LASER_POOL_SIZE, "player_lasers"))
+            self.enemies = ArrayPool(EnemyView, ENEMY_POOL_SIZE, "enemies")
+            self.enemy_lasers = ArrayPool(LaserView, ENEMY_LASER_POOL_SIZE, "enemy_lasers")
+            self.meteors = ArrayPool(MeteorView, METEOR_POOL_SIZE, "meteors")
+            self.rng = engine.np.random.default_rng(self.random.getrandbits(64))
+        else:
+            self.player = Player(300, 500)
+            self.enemies = Pool(Enemy, ENEMY_POOL_SIZE, "enemies")
+            self.enemy_lasers = Pool(Laser, ENEMY_LASER_POOL_SIZE, "enemy_lasers")
+            self.meteors = Pool(Meteor, METEOR_POOL_SIZE, "meteors")
+        self.explosions = Pool(Explosion, EXPLOSION_POOL_SIZE, "explosions")
+        self.waves_path = waves_path  # None plays default_waves()
+        if waves_path is None:
+            self.waves = waves.WaveScheduler(default_waves())
+        else:
+            self.waves = waves.WaveScheduler(waves.load_waves(waves_path, TICKS_PER_SECOND))
+        self.enemy_grid = SpatialHash()
+        self.meteor_grid = SpatialHash()
+        self.profiler = NULL_PROFILER
+        self.ticks = 0
+
+    @property
+    def game_over(self):
+        return self.player.lives <= 0
+
+    def pools(self):
+        return (self.player.lasers, self.enemy_lasers, self.enemies, self.meteors, self.explosions)
+
+    # Occupancy and high-water marks for every entity pool
+    def pool_stats(self):
+        return [pool.stats() for pool in self.pools()]
+
+# Advance the game by one fixed tick. No drawing, no display calls
+def step(state, inputs):
+    profiler = state.profiler
+    update_effects(state)
+
+    # Handle player movement and shooting
+    state.player.move(inputs)
+
+    with profiler.scope("spawn"):
+        spawn_entities(state)
+    with profiler.scope("update"):
+        if state.vectorized:
+            update_entities_vectorized(state)
+        else:
+            update_entities(state)
+    state.ticks += 1
+
+# Step and, when recording, log the inputs and checkpoint hashes
+def advance(state, inputs, recorder=None):
+    step(state, inputs)
+    if recorder is not None:
+        recorder.record(inputs)
+        if state.ticks % recorder.checkpoint_interval == 0:
+            recorder.checkpoint(state.ticks, state_hash(state))
+
+# Hash of everything that decides how the game plays out from here
+def state_hash(state):
+    player = state.player
+    values = array("q", (state.ticks, state.waves.batches,
+                         player.x, player.y, player.lives, player.score,
+                         player.cool_down_counter, player.damage_counter, player.is_damaged))
+    for pool in state.pools():
+        values.append(len(pool))
+        for item in pool:
+            values.append(item.x)
+            values.append(item.y)
+    return hashlib.blake2b(values.tobytes(), digest_size=replay.HASH_SIZE).digest()
+
+# Update explosions and the player's damage effect
+def update_effects(state):
+    explosions = state.explosions
+    for explosion in reversed(explosions):
+        explosion.update()
+        if explosion.timer <= 0:  # Remove explosion when timer runs out
+            explosions.release(explosion)
+    state.player.update_damage()
+
+# The original endless trickle: one enemy every ENEMY_SPAWN_RATE ticks
+# and one meteor every METEOR_SPAWN_RATE ticks at random positions
+def default_waves():
+    return [
+        waves.Wave("enemies", "enemy", every=ENEMY_SPAWN_RATE, repeat=0),
+        waves.Wave("meteors", "meteor", every=METEOR_SPAWN_RATE, repeat=0),
+    ]
+
+# Spawn every wave batch that is due this tick
+def spawn_entities(state):
+    for wave, start, stop in state.waves.due(state.ticks):
+        if wave.kind == "enemy":
+            pool, asset = state.enemies, get_asset("enemy")
+        else:
+            pool, asset = state.meteors, get_asset("meteor")
+        positions = waves.formation_positions(wave, start, stop, WIDTH, asset.width, asset.height, state.random)
+        for spawned, (x, y) in enumerate(positions):
+            entity = pool.acquire(x, y, asset)
+            if entity is None:
+                # Pool is full, so the rest of the batch is dropped too
+                pool.dropped += len(positions) - spawned - 1
+                break
+            if wave.kind == "enemy":
+                entity.fire_odds = wave.fire_odds
+
+# Update enemy, meteor, and player laser movements one object at a time
+def update_entities(state):
+    player = state.player
+    enemies = state.enemies
+    meteors = state.meteors
+    explosions = state.explosions
+
+    move_enemy_lasers(state.enemy_lasers, ENEMY_LASER_VELOCITY, player, explosions)  # Pass explosions
+
+    for enemy in reversed(enemies):
+        enemy.move(ENEMY_VELOCITY)
+        enemy.cooldown()
+
+        if enemy.fire_odds and state.random.randint(0, enemy.fire_odds) == 1:
+            enemy.shoot(state.enemy_lasers)
+
+        if collide(enemy, player):
+            player.take_damage(explosions)  # Pass explosions
+            play_sound("explosion", enemy.x)
+            enemies.release(enemy)
+            explosions.acquire(enemy.x, enemy.y)
+
+        elif enemy.y + enemy.get_height() > GAME_HEIGHT:
+            enemies.release(enemy)
+
+    for meteor in reversed(meteors):
+        meteor.move(METEOR_VELOCITY)
+        if collide(meteor, player):
+            player.take_damage(explosions)  # Pass explosions
+            play_sound("explosion", meteor.x)
+            meteors.release(meteor)
+            explosions.acquire(meteor.x, meteor.y)
+
+        elif meteor.y + meteor.get_height() > GAME_HEIGHT:
+            meteors.release(meteor)
+
+    with state.profiler.scope("collisions"):
+        player.move_lasers(-LASER_VELOCITY, enemies, meteors, explosions,
+                           state.enemy_grid, state.meteor_grid)  # Pass explosions
+
+# Same rules as update_entities, but movement, culling, fire rolls and
+# bounding box tests run over whole arrays. Only the few entities those
+# tests flag are touched one at a time. Flagged slots are handled from
+# the highest down so swap-remove never moves an unvisited one
+def update_entities_vectorized(state):
+    np = engine.np
+    player = state.player
+    enemies = state.enemies
+    meteors = state.meteors
+    explosions = state.explosions
+    enemy_lasers = state.enemy_lasers
+    player_box = (player.x, player.y, player.x + player.asset.width, player.y + player.asset.height)
+
+    # Enemy lasers
+    arrays = enemy_lasers.arrays
+    gone = engine.orphaned(arrays, enemies.arrays)
+    engine.integrate(arrays, ENEMY_LASER_VELOCITY)
+    gone |= engine.off_screen(arrays, GAME_HEIGHT)
+    touching = engine.overlaps_box(arrays, player_box) & ~gone
+    for index in np.flatnonzero(gone | touching)[::-1]:
+        laser = enemy_lasers[index]
+        if gone[index]:
+            enemy_lasers.release(laser)
+        elif laser.collision(player):
+            player.take_damage(explosions)
+            play_sound("explosion", player.x)
+            enemy_lasers.release(laser)
+
+    # Enemies: move, fire, then hit the player or leave the screen
+    arrays = enemies.arrays
+    engine.integrate(arrays, ENEMY_VELOCITY)
+    engine.tick_cooldowns(arrays, Enemy.COOLDOWN)
+    firing = engine.fire_rolls(state.rng, arrays) & (arrays.cooldown[:arrays.count] == 0)
+    for index in np.flatnonzero(firing):
+        enemies[index].shoot(enemy_lasers)
+    touching = engine.overlaps_box(arrays, player_box)
+    leaving = engine.below(arrays, GAME_HEIGHT)
+    for index in np.flatnonzero(touching | leaving)[::-1]:
+        enemy = enemies[index]
+        if touching[index] and collide(enemy, player):
+            player.take_damage(explosions)
+            play_sound("explosion", enemy.x)
+            explosions.acquire(enemy.x, enemy.y)
+            enemies.release(enemy)
+        elif leaving[index]:
+            enemies.release(enemy)
+
+    # Meteors
+    arrays = meteors.arrays
+    engine.integrate(arrays, METEOR_VELOCITY)
+    touching = engine.overlaps_box(arrays, player_box)
+    leaving = engine.below(arrays, GAME_HEIGHT)
+    for index in np.flatnonzero(touching | leaving)[::-1]:
+        meteor = meteors[index]
+        if touching[index] and collide(meteor, player):
+            player.take_damage(explosions)
+            play_sound("explosion", meteor.x)
+            explosions.acquire(meteor.x, meteor.y)
+            meteors.release(meteor)
+        elif leaving[index]:
+            meteors.release(meteor)
+
+    # Player lasers
+    with state.profiler.scope("collisions"):
+        player.cooldown()
+        lasers = player.lasers
+        arrays = lasers.arrays
+        engine.integrate(arrays, -LASER_VELOCITY)
+        for index in np.flatnonzero(engine.off_screen(arrays, GAME_HEIGHT))[::-1]:
+            lasers.release(lasers[index])
+
+        # Resolve candidate pairs to records before anything is released
+        candidates = {}
+        for targets in (enemies, meteors):
+            laser_rows, target_rows = engine.overlap_pairs(arrays, targets.arrays)
+            for laser_row, target_row in zip(laser_rows.tolist(), target_rows.tolist()):
+                candidates.setdefault(lasers[laser_row], []).append((targets, targets[target_row]))
+
+        for laser, hits in candidates.items():
+            for targets, target in hits:
+                if target.index < 0 or not laser.collision(target):
+                    continue
+                play_sound("explosion", target.x)
+                if targets is enemies:
+                    player.score += 10
+                explosions.acquire(target.x, target.y)
+                targets.release(target)
+                lasers.release(laser)
+                break  # Stop checking after removing laser
+
+# Draw the current state, blending positions between the last two ticks
+def draw_frame(state, alpha=1.0):
+    renderer.begin_frame()
+    state.player.draw(renderer, alpha)
+
+    # One batch per pool; all lasers share a layer whoever fired them
+    renderer.blits(state.player.lasers.sprites(alpha), LAYER_LASERS)
+    renderer.blits(state.enemy_lasers.sprites(alpha), LAYER_LASERS)
+    renderer.blits(state.enemies.sprites(alpha), LAYER_SHIPS)
+    renderer.blits(state.meteors.sprites(alpha), LAYER_METEORS)
+    renderer.blits([(explosion.img, (explosion.x, explosion.y)) for explosion in state.explosions],
+                   LAYER_EFFECTS)
+
+    player = state.player
+    renderer.draw_status((player.score, state.high_score, player.lives),
+                         lambda: draw_status_bar(player, state.high_score))
+    if state.profiler.overlay_visible:
+        draw_profiler_overlay(state.profiler)
+    with state.profiler.scope("display"):
+        renderer.end_frame()
+
+# Profiler overlay, toggled with F3. The text is re-rendered a few times a
+# second rather than every frame
+OVERLAY_REFRESH_FRAMES = 15
+overlay_labels = []
+
+def draw_profiler_overlay(profiler):
+    global overlay_labels
+    if not overlay_labels or profiler.frame_count % OVERLAY_REFRESH_FRAMES == 0:
+        overlay_labels = [overlay_font.render(line, 1, (255, 255, 0)) for line in profiler.summary_lines()]
+    y = 5
+    for label in overlay_labels:
+        renderer.blit(label, (5, y))
+        y += label.get_height()
+
+# Entity counts shown in the overlay and exported with each frame
+def count_entities(profiler, state):
+    profiler.count("enemies", len(state.enemies))
+    profiler.count("meteors", len(state.meteors))
+    profiler.count("lasers", len(state.player.lasers) + len(state.enemy_lasers))
+    profiler.count("explosions", len(state.explosions))
+
+# Turn the keyboard state into input bits
+def read_input():
+    keys = pygame.key.get_pressed()
+    inputs = 0
+    if keys[pygame.K_LEFT]:
+        inputs |= INPUT_LEFT
+    if keys[pygame.K_RIGHT]:
+        inputs |= INPUT_RIGHT
+    if keys[pygame.K_UP]:
+        inputs |= INPUT_UP
+    if keys[pygame.K_DOWN]:
+        inputs |= INPUT_DOWN
+    if keys[pygame.K_SPACE]:
+        inputs |= INPUT_FIRE
+    return inputs
+
+# Input policy for headless runs: hold fire and wander left and right.
+# It draws from state.policy_random, never state.random
+def random_policy(state):
+    rng = state.policy_random
+    inputs = INPUT_FIRE
+    if rng.random() < 0.5:
+        inputs |= rng.choice((INPUT_LEFT, INPUT_RIGHT))
+    return inputs
+
+# Run one game as fast as possible with no display and no sound
+# With a profiler, every tick is profiled as one frame
+def run_headless(policy=random_policy, max_ticks=None, vectorized=False, seed=None, record_path=None,
+                 profiler=None, waves_path=None):
+    state = GameState(vectorized=vectorized, seed=seed, waves_path=waves_path)
+    recorder = start_recording(record_path, state)
+    if profiler is None:
+        while not state.game_over and (max_ticks is None or state.ticks < max_ticks):
+            advance(state, policy(state), recorder)
+    else:
+        state.profiler = profiler
+        while not state.game_over and (max_ticks is None or state.ticks < max_ticks):
+            profiler.begin_frame()
+            advance(state, policy(state), recorder)
+            count_entities(profiler, state)
+            profiler.end_frame()
+    stop_recording(recorder, state)
+    return state
+
+def start_recording(path, state):
+    if path is None:
+        return None
+    digest = None if state.waves_path is None else waves.file_digest(state.waves_path, replay.HASH_SIZE)
+    return replay.InputRecorder(path, state.seed, CHECKPOINT_INTERVAL, state.vectorized,
+                                state.waves_path, digest)
+
+def stop_recording(recorder, state):
+    if recorder is not None:
+        recorder.close(state.ticks, state_hash(state))
+
+# Re-simulate a recording headlessly and compare every checkpoint hash.
+# Returns the final state, the ticks whose hashes didn't match and
+# whether the file ended in a torn record (e.g. after a crash). The
+# wave file named in the recording is loaded again, from waves_path if
+# given, and must be unchanged; raises ValueError otherwise
+def replay_recording(path, waves_path=None):
+    recording = replay.read_recording(path)
+    if recording.waves_path is None:
+        if waves_path is not None:
+            raise ValueError("recorded with the default waves; replay it without --waves")
+    else:
+        waves_path = waves_path or recording.waves_path
+        try:
+            digest = waves.file_digest(waves_path, replay.HASH_SIZE)
+        except OSError:
+            digest = None
+        if digest != recording.waves_digest:
+            raise ValueError(f"recorded with waves {recording.waves_path}, but {waves_path} "
+                             "is missing or has changed; pass the original file with --waves")
+    state = GameState(vectorized=recording.vectorized, seed=recording.seed, waves_path=waves_path)
+    mismatches = []
+    for inputs in recording.inputs:
+        step(state, inputs)
+        expected = recording.checkpoints.get(state.ticks)
+        if expected is not None and expected != state_hash(state):
+            mismatches.append(state.ticks)
+    if recording.final is not None:
+        tick, expected = recording.final
+        if tick != state.ticks or expected != state_hash(state):
+            mismatches.append(state.ticks)
+    return state, mismatches, recording.truncated
+
 # Main game loop
-def main():
+def main(vectorized=False, seed=None, record_path=None, profile_path=None, startup_report=False,
+         waves_path=None, player_name=DEFAULT_PLAYER, mode=DEFAULT_MODE):
+    init_display()
+    init_audio()
     clock = pygame.time.Clock()
-    run = True
-    player = Player(300, 500)
-    high_score = load_high_score()
-    enemies = []
-    meteors = []
-    explosions = []  # Initialize explosions list here
-    enemy_spawn_counter = 0
-    meteor_spawn_counter = 0
-
-    pygame.mixer.music.play(-1)
-
-    while run:
-        clock.tick(60)
-        screen.blit(background_img, (0, 0))
-        player.draw(screen)
-
-        # Draw and update enemies, meteors, and explosions
-        for enemy in enemies:
-            enemy.draw(screen)
-        for meteor in meteors:
-            meteor.draw(screen)
-        for explosion in explosions:
-            explosion.draw(screen)
-            if explosion.timer <= 0:  # Remove explosion when timer runs out
-                explosions.remove(explosion)
-
-        draw_status_bar(player, high_score)
-        pygame.display.update()
+    score_store = open_score_store()
+    state = GameState(score_store.high_score(player_name, mode), vectorized, seed, waves_path)
+    state.profiler = profiler = FrameProfiler(keep_frames=profile_path is not None)
+    recorder = start_recording(record_path, state)
+    accumulator = 0.0
 
-        # Check for game over
-        if player.lives <= 0:
-            if player.score > high_score:
-                save_high_score(player.score)
-            game_over_screen(player, high_score)
+    while True:
+        frame_time = min(clock.tick(RENDER_FPS) / 1000.0, MAX_FRAME_TIME)
+        accumulator += frame_time
+        profiler.begin_frame()
 
         # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-        # Handle player movement and shooting
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT] and player.x - PLAYER_VELOCITY > 0:
-            player.x -= PLAYER_VELOCITY
-        if keys[pygame.K_RIGHT] and player.x + PLAYER_VELOCITY + player.get_width() < WIDTH:
-            player.x += PLAYER_VELOCITY
-        if keys[pygame.K_UP] and player.y - PLAYER_VELOCITY > 0:
-            player.y -= PLAYER_VELOCITY
-        if keys[pygame.K_DOWN] and player.y + PLAYER_VELOCITY + player.get_height() < GAME_HEIGHT:
-            player.y += PLAYER_VELOCITY
-        if keys[pygame.K_SPACE]:
-            player.shoot()
-
-        # Spawn enemies and meteors
-        if enemy_spawn_counter == 0:
-            enemy_x = random.randint(0, WIDTH - enemy_img.get_width())
-            enemy_y = random.randint(-100, -40)
-            enemy = Enemy(enemy_x, enemy_y, enemy_img)
-            enemies.append(enemy)
-        if meteor_spawn_counter == 0:
-            meteor_x = random.randint(0, WIDTH - meteor_img.get_width())
-            meteor_y = random.randint(-100, -40)
-            meteor = Meteor(meteor_x, meteor_y, meteor_img)
-            meteors.append(meteor)
-
-        # Update counters
-        enemy_spawn_counter = (enemy_spawn_counter + 1) % ENEMY_SPAWN_RATE
-        meteor_spawn_counter = (meteor_spawn_counter + 1) % METEOR_SPAWN_RATE
-
-        # Update enemy, meteor, and player laser movements
-        for enemy in enemies[:]:
-            enemy.move(ENEMY_VELOCITY)
-            enemy.move_lasers(ENEMY_LASER_VELOCITY, player, explosions)  # Pass explosions
-
-            if random.randint(0, 2 * 60) == 1:
-                enemy.shoot()
-
-            if collide(enemy, player):
-                player.take_damage(explosions)  # Pass explosions
-                explosion_sound.play()
-                enemies.remove(enemy)
-                explosions.append(Explosion(enemy.x, enemy.y))
-
-            elif enemy.y + enemy.get_height() > GAME_HEIGHT:
-                enemies.remove(enemy)
-
-        for meteor in meteors[:]:
-            meteor.move(METEOR_VELOCITY)
-            if collide(meteor, player):
-                player.take_damage(explosions)  # Pass explosions
-                explosion_sound.play()
-                meteors.remove(meteor)
-                explosions.append(Explosion(meteor.x, meteor.y))
-
-            elif meteor.y + meteor.get_height() > GAME_HEIGHT:
-                meteors.remove(meteor)
-
-        player.move_lasers(-LASER_VELOCITY, enemies, meteors, explosions)  # Pass explosions
+        with profiler.scope("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    stop_recording(recorder, state)
+                    stop_profiling(profiler, profile_path)
+                    close_score_store(score_store)
+                    pygame.quit()
+                    sys.exit()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    profiler.overlay_visible = not profiler.overlay_visible
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    renderer.invalidate()  # The window lost its contents; repaint all of it
+
+        # Run as many fixed ticks as the elapsed time covers
+        with profiler.scope("simulate"):
+            inputs = read_input()
+            sound_manager.listener_x = state.player.x + state.player.get_width() / 2
+            while accumulator >= TICK_TIME:
+                advance(state, inputs, recorder)
+                accumulator -= TICK_TIME
+                if state.game_over:
+                    break
+
+        # Start this frame's sounds, merging repeats
+        with profiler.scope("audio"):
+            sound_manager.flush()
+        for name, value in sound_manager.stats.items():
+            profiler.count("sound_" + name, value)
+        profiler.count("label_hits", labels.hits)
+        profiler.count("label_misses", labels.misses)
+
+        with profiler.scope("draw"):
+            draw_frame(state, accumulator / TICK_TIME)
+        count_entities(profiler, state)
+        profiler.end_frame()
+
+        if "first_frame" not in startup_times:
+            mark_startup("first_frame")
+            if startup_report:
+                print(startup_report_text())
+
+        # Check for game over
+        if state.game_over:
+            stop_recording(recorder, state)
+            stop_profiling(profiler, profile_path)
+            player = state.player
+            score_store.submit(player_name, mode, player.score, ticks=state.ticks, seed=state.seed)
+            show_game_over(player, score_store.high_score(player_name, mode),
+                           score_store.leaderboard(player_name, mode))
+            close_score_store(score_store)
+            pygame.quit()
+            sys.exit()
+
+def startup_report_text():
+    lines = [f"{phase}: {seconds * 1000:.1f} ms" for phase, seconds in startup_times.items()]
+    lines.append(assets.report())
+    return "\n".join(lines)
+
+def stop_profiling(profiler, path):
+    if path is not None:
+        profiler.export(path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Galaxy Shooter")
+    parser.add_argument("--headless", action="store_true",
+                        help="run games with no window or sound as fast as possible")
+    parser.add_argument("--games", type=int, default=1,
+                        help="number of headless games to run")
+    parser.add_argument("--max-ticks", type=int, default=None,
+                        help="stop each headless game after this many ticks")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="run the simulation on the NumPy array engine")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the game's random stream")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="record inputs and checkpoint hashes to PATH; numbered per headless game")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="re-simulate a recording headlessly and verify its hashes")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="export per-frame timings to PATH (.csv or .json); numbered per headless game")
+    parser.add_argument("--waves", metavar="PATH", default=None,
+                        help="play the waves defined in this JSON file instead of the default trickle; "
+                             "with --replay, where to find the recording's wave file")
+    parser.add_argument("--player", default=DEFAULT_PLAYER,
+                        help="name the score is saved under")
+    parser.add_argument("--leaderboard", action="store_true",
+                        help="print the top scores for --player and the game mode")
+    parser.add_argument("--asset-report", action="store_true",
+                        help="load every image and print how long each one took")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long startup took once the first frame is shown")
+    parser.add_argument("--build-bundle", action="store_true",
+                        help=f"pack every asset into {BUNDLE_FILE}; rebuild it after changing assets")
+    return parser.parse_args()
+
+# With several games each one gets its own file: run.csv -> run_1.csv, ...
+def game_path(path, game, games):
+    if games == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{game + 1}{ext}"
+
+def headless_main(args):
+    start = time.perf_counter()
+    total_ticks = 0
+    for i in range(args.games):
+        seed = None if args.seed is None else args.seed + i
+        record_path = game_path(args.record, i, args.games) if args.record else None
+        profiler = FrameProfiler(keep_frames=True) if args.profile else None
+        state = run_headless(max_ticks=args.max_ticks, vectorized=args.vectorized,
+                             seed=seed, record_path=record_path, profiler=profiler,
+                             waves_path=args.waves)
+        total_ticks += state.ticks
+        print(f"Game {i + 1}: score {state.player.score}, {state.ticks} ticks")
+        if profiler is not None:
+            print("\n".join(profiler.summary_lines()))
+            stop_profiling(profiler, game_path(args.profile, i, args.games))
+        for stats in state.pool_stats():
+            print(f"  {stats['name']}: peak {stats['high_water']}/{stats['capacity']}, "
+                  f"{stats['allocated']} allocated, {stats['dropped']} dropped")
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games, {total_ticks} ticks in {elapsed:.2f}s "
+          f"({total_ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+
+# Waves loaded from a file get their own leaderboards
+def game_mode(waves_path):
+    if waves_path is None:
+        return DEFAULT_MODE
+    return os.path.splitext(os.path.basename(waves_path))[0]
+
+def leaderboard_main(player_name, mode):
+    try:
+        store = scores.read_scores(SCORE_DIR)
+    except OSError as error:
+        sys.exit(f"Could not read scores in {SCORE_DIR}: {error}")
+    board = store.leaderboard(player_name, mode)
+    print(f"Top scores for {player_name}, {mode} ({store.count} games recorded for all players and modes)")
+    for i, record in enumerate(board):
+        played = time.strftime("%Y-%m-%d %H:%M", time.localtime(record["time"]))
+        print(f"{i + 1:>3}. {record['score']:>7}  {played}")
+
+def replay_main(path, waves_path=None):
+    start = time.perf_counter()
+    try:
+        state, mismatches, truncated = replay_recording(path, waves_path)
+    except ValueError as error:
+        sys.exit(f"Can't replay {path}: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {state.ticks} ticks in {elapsed:.2f}s: score {state.player.score}")
+    if truncated:
+        print("Recording ends in a torn record; replayed everything before it")
+    if mismatches:
+        print(f"MISMATCH at ticks {mismatches}")
+        sys.exit(1)
+    print("All checkpoints match")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.waves is not None and not (args.replay or args.leaderboard):
+        try:
+            waves.load_waves(args.waves, TICKS_PER_SECOND)  # Fail here, not once the window is open
+        except ValueError as error:
+            sys.exit(f"Can't load waves from {error}")
+    if args.build_bundle:
+        images, sounds = build_bundle()
+        print(f"Packed {images} images and {sounds} sounds into {BUNDLE_FILE}")
+    elif args.asset_report:
+        start = time.perf_counter()
+        assets.preload()
+        print(assets.report())
+        print(f"total: {(time.perf_counter() - start) * 1000:.2f} ms")
+    elif args.leaderboard:
+        leaderboard_main(args.player, game_mode(args.waves))
+    elif args.replay:
+        replay_main(args.replay, args.waves)
+    elif args.headless:
+        headless_main(args)
+    else:
+        main(args.vectorized, args.seed, args.record, args.profile, args.startup_report,
+             args.waves, args.player, game_mode(args.waves))
@@ -0,0 +1,188 @@
+# Frame profiler: named timing scopes, rolling percentiles, entity and
+# allocation counts, and per-frame export to CSV or JSON.
+import csv
+import gc
+import json
+import sys
+import time
+from collections import deque
+
+HISTORY_FRAMES = 600  # Rolling window used for the percentiles (10 s at 60 FPS)
+COUNTS_PER_LINE = 4  # Keeps the overlay inside the window
+
+class _Scope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        profiler = self.profiler
+        if self.name not in profiler.parents:
+            profiler.parents[self.name] = profiler.stack[-1] if profiler.stack else None
+        profiler.stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        timings = profiler.current
+        timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        profiler.stack.pop()
+        return False
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+# Times named phases of each frame. Scopes entered more than once in a
+# frame (e.g. once per simulation tick) add up. A scope opened inside
+# another is part of its parent's time, and the summary shows it indented
+# under the parent
+class FrameProfiler:
+    def __init__(self, history=HISTORY_FRAMES, keep_frames=False):
+        self.history = history
+        self.keep_frames = keep_frames  # Keep every frame for export
+        self.frames = []
+        self.scope_names = []
+        self.samples = {}
+        self.worst = {}
+        self.scopes = {}
+        self.parents = {}  # scope -> enclosing scope the first time it ran
+        self.stack = []
+        self.current = {}
+        self.counts = {}
+        self.frame_count = 0
+        self.overlay_visible = False
+        self._frame_start = 0.0
+        self._blocks = 0
+        self._collections = 0
+
+    def scope(self, name):
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = _Scope(self, name)
+            self.scope_names.append(name)
+            self.samples[name] = deque(maxlen=self.history)
+            self.worst[name] = 0.0
+        return scope
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def begin_frame(self):
+        self.current = {}
+        self._blocks = sys.getallocatedblocks()
+        self._collections = _gc_collections()
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        total = time.perf_counter() - self._frame_start
+        self.current["frame"] = total
+        self.scope("frame")
+        for name in self.scope_names:
+            seconds = self.current.get(name, 0.0)
+            self.samples[name].append(seconds)
+            if seconds > self.worst[name]:
+                self.worst[name] = seconds
+        self.counts["allocated_blocks"] = sys.getallocatedblocks() - self._blocks
+        self.counts["gc_collections"] = _gc_collections() - self._collections
+        self.frame_count += 1
+        if self.keep_frames:
+            record = {"frame": self.frame_count}
+            for name in self.scope_names:
+                record[name + "_ms"] = round(self.current.get(name, 0.0) * 1000, 4)
+            record.update(self.counts)
+            self.frames.append(record)
+
+    # (p50, p95, p99, worst) in milliseconds over the rolling window
+    def percentiles(self, name):
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return (0.0, 0.0, 0.0, 0.0)
+        last = len(samples) - 1
+        return (samples[last * 50 // 100] * 1000, samples[last * 95 // 100] * 1000,
+                samples[last * 99 // 100] * 1000, self.worst[name] * 1000)
+
+    # Scope names in tree order with their nesting depth, frame first
+    def scope_tree(self):
+        children = {}
+        for name in self.scope_names:
+            if name != "frame":
+                children.setdefault(self.parents.get(name), []).append(name)
+        order = [("frame", 0)]
+
+        def visit(parent, depth):
+            for name in children.get(parent, ()):
+                order.append((name, depth))
+                visit(name, depth + 1)
+
+        visit(None, 1)
+        return order
+
+    def summary_lines(self):
+        lines = ["scope            p50    p95    p99  worst (ms)"]
+        for name, depth in self.scope_tree():
+            p50, p95, p99, worst = self.percentiles(name)
+            label = "  " * depth + name
+            lines.append(f"{label:<14} {p50:6.2f} {p95:6.2f} {p99:6.2f} {worst:6.2f}")
+        counts = [f"{name} {value}" for name, value in self.counts.items()]
+        for first in range(0, len(counts), COUNTS_PER_LINE):
+            lines.append("  ".join(counts[first:first + COUNTS_PER_LINE]))
+        return lines
+
+    def export(self, path):
+        if path.endswith(".json"):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+    def export_csv(self, path):
+        fields = []
+        for record in self.frames:
+            for key in record:
+                if key not in fields:
+                    fields.append(key)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.frames)
+
+    def export_json(self, path):
+        summary = {}
+        for name in self.scope_names:
+            p50, p95, p99, worst = self.percentiles(name)
+            summary[name] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "worst_ms": worst,
+                             "parent": self.parents.get(name)}
+        with open(path, "w") as file:
+            json.dump({"summary": summary, "frames": self.frames}, file)
+
+# Stand-in used when profiling is off; every scope is a shared no-op
+class NullProfiler:
+    overlay_visible = False
+
+    def scope(self, name):
+        return _NULL_SCOPE
+
+    def count(self, name, value):
+        pass
+
+    def begin_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+def _gc_collections():
+    return sum(generation["collections"] for generation in gc.get_stats())
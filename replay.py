@@ -0,0 +1,153 @@
+# Compact binary recordings of per-tick input bitmasks, with state hashes
+# at regular checkpoints so a replay can prove it re-simulated bit-exactly.
+#
+# File layout: a fixed header, the wave file the game was played with (a
+# u16 path length, the UTF-8 path and, unless the path is empty, a 16
+# byte hash of the file's contents), then a stream of records
+#   b"I" <run length varint> <input byte>   the same input held for N ticks
+#   b"C" <tick varint> <16 byte hash>       state hash after that tick
+#   b"E" <tick varint> <16 byte hash>       end of recording
+# Records are appended as the game runs and the file is flushed at every
+# checkpoint, so a crash loses at most the ticks since the last one.
+import struct
+
+MAGIC = b"GSRP"
+VERSION = 2  # 2: state hashes cover the wave scheduler instead of spawn counters
+HEADER = struct.Struct("<4sHBQI")  # magic, version, flags, seed, checkpoint interval
+WAVES_LENGTH = struct.Struct("<H")
+FLAG_VECTORIZED = 1
+HASH_SIZE = 16
+
+def _write_varint(file, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            file.write(bytes((byte | 0x80,)))
+        else:
+            file.write(bytes((byte,)))
+            return
+
+# Raised when the stream ends inside a record
+class _Truncated(Exception):
+    pass
+
+def _read_varint(file):
+    value = 0
+    shift = 0
+    while True:
+        data = file.read(1)
+        if not data:
+            raise _Truncated()
+        value |= (data[0] & 0x7F) << shift
+        if not data[0] & 0x80:
+            return value
+        shift += 7
+
+class InputRecorder:
+    # waves_path/waves_digest name the wave file in use, None for the default waves
+    def __init__(self, path, seed, checkpoint_interval, vectorized=False, waves_path=None, waves_digest=None):
+        self.file = open(path, "wb")
+        self.checkpoint_interval = checkpoint_interval
+        self.run_input = None
+        self.run_length = 0
+        flags = FLAG_VECTORIZED if vectorized else 0
+        self.file.write(HEADER.pack(MAGIC, VERSION, flags, seed, checkpoint_interval))
+        name = (waves_path or "").encode("utf-8")
+        self.file.write(WAVES_LENGTH.pack(len(name)) + name)
+        if name:
+            self.file.write(waves_digest)
+
+    def record(self, inputs):
+        if inputs == self.run_input:
+            self.run_length += 1
+            return
+        self._flush_run()
+        self.run_input = inputs
+        self.run_length = 1
+
+    def _flush_run(self):
+        if self.run_length:
+            self.file.write(b"I")
+            _write_varint(self.file, self.run_length)
+            self.file.write(bytes((self.run_input,)))
+            self.run_length = 0
+
+    def checkpoint(self, tick, digest):
+        self._flush_run()
+        self.file.write(b"C")
+        _write_varint(self.file, tick)
+        self.file.write(digest)
+        self.file.flush()
+
+    def close(self, tick, digest):
+        if self.file.closed:
+            return
+        self._flush_run()
+        self.file.write(b"E")
+        _write_varint(self.file, tick)
+        self.file.write(digest)
+        self.file.close()
+
+class Recording:
+    def __init__(self, seed, checkpoint_interval, vectorized):
+        self.seed = seed
+        self.checkpoint_interval = checkpoint_interval
+        self.vectorized = vectorized
+        self.waves_path = None  # Wave file the game used, None for the default waves
+        self.waves_digest = None
+        self.inputs = bytearray()  # One input byte per tick
+        self.checkpoints = {}  # tick -> state hash
+        self.final = None  # (tick, state hash), None if the game never ended cleanly
+        self.truncated = False  # The file ends in a torn record, e.g. after a crash
+
+def read_recording(path):
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("not a recording: header is truncated")
+        magic, version, flags, seed, interval = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("not a recording: bad magic")
+        if version != VERSION:
+            raise ValueError(f"unsupported recording version {version}")
+
+        recording = Recording(seed, interval, bool(flags & FLAG_VECTORIZED))
+        data = file.read(WAVES_LENGTH.size)
+        if len(data) < WAVES_LENGTH.size:
+            raise ValueError("not a recording: header is truncated")
+        (length,) = WAVES_LENGTH.unpack(data)
+        if length:
+            name = file.read(length)
+            digest = file.read(HASH_SIZE)
+            if len(name) < length or len(digest) < HASH_SIZE:
+                raise ValueError("not a recording: header is truncated")
+            recording.waves_path = name.decode("utf-8")
+            recording.waves_digest = digest
+        # A torn final record ends the stream; everything before it is kept
+        try:
+            while True:
+                kind = file.read(1)
+                if not kind:
+                    break
+                if kind == b"I":
+                    length = _read_varint(file)
+                    data = file.read(1)
+                    if not data:
+                        raise _Truncated()
+                    recording.inputs.extend(data * length)
+                elif kind in (b"C", b"E"):
+                    tick = _read_varint(file)
+                    digest = file.read(HASH_SIZE)
+                    if len(digest) < HASH_SIZE:
+                        raise _Truncated()
+                    if kind == b"C":
+                        recording.checkpoints[tick] = digest
+                    else:
+                        recording.final = (tick, digest)
+                        break
+                else:
+                    raise ValueError(f"unknown record type {kind!r}")
+        except _Truncated:
+            recording.truncated = True
+    return recording
@@ -0,0 +1,243 @@
+# Crash-safe score store. Every finished game is appended to a log as one
+# checksummed record and fsynced before it counts, so a crash can only
+# lose the record being written. A torn or corrupt tail is ignored when
+# the log is opened and cut off before the next append.
+#
+# The leaderboards (top N per profile and game mode) are kept in an index
+# file together with the log offset they cover. The index is rewritten
+# through a temporary file and os.replace, so it is either the old or the
+# new version. Opening the store reads the index and only scans records
+# appended after it, however long the history is.
+#
+# Appends run on a background thread: submit() updates the in-memory
+# leaderboards at once and returns without touching the disk.
+#
+# Log record: u32 payload length, u32 CRC-32 of the payload, then the
+# payload as UTF-8 JSON {"profile", "mode", "score", "time", ...}.
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+LOG_FILE = "scores.log"
+INDEX_FILE = "scores.idx"
+RECORD_HEADER = struct.Struct("<II")
+INDEX_VERSION = 1
+TOP_N = 10
+INDEX_INTERVAL = 32  # Rewrite the index after this many new records
+
+class Leaderboards:
+    def __init__(self, size=TOP_N):
+        self.size = size
+        self.boards = {}  # (profile, mode) -> records, best first
+
+    # Insert a record and return its 0-based rank, or None if it didn't
+    # make the board. Equal scores keep the earlier record ahead
+    def add(self, record):
+        board = self.boards.setdefault((record["profile"], record["mode"]), [])
+        rank = len(board)
+        for i, entry in enumerate(board):
+            if record["score"] > entry["score"]:
+                rank = i
+                break
+        if rank >= self.size:
+            return None
+        board.insert(rank, record)
+        del board[self.size:]
+        return rank
+
+    def top(self, profile, mode):
+        return list(self.boards.get((profile, mode), ()))
+
+    def to_json(self):
+        return [{"profile": profile, "mode": mode, "records": board}
+                for (profile, mode), board in self.boards.items()]
+
+    @classmethod
+    def from_json(cls, data, size=TOP_N):
+        leaderboards = cls(size)
+        for board in data:
+            for record in board["records"]:
+                leaderboards.add(record)
+        return leaderboards
+
+# Yield (record, end offset) for every intact record from the file's
+# current position. Stops at the first short, corrupt or unreadable one
+def read_records(file):
+    offset = file.tell()
+    while True:
+        header = file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        length, checksum = RECORD_HEADER.unpack(header)
+        payload = file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+        try:
+            record = json.loads(payload.decode("utf-8"))
+        except ValueError:
+            return
+        offset += RECORD_HEADER.size + length
+        yield record, offset
+
+# (leaderboards, log offset, record count) from the index, or empty ones
+# when it's missing, damaged or doesn't match a log of log_size bytes
+def load_index(index_path, log_size, size=TOP_N):
+    try:
+        with open(index_path) as file:
+            data = json.load(file)
+        if data["version"] == INDEX_VERSION and data["log_size"] <= log_size:
+            return Leaderboards.from_json(data["boards"], size), data["log_size"], data["records"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return Leaderboards(size), 0, 0
+
+# Read the index plus any records appended after it. Returns (leaderboards,
+# end of the last intact record, record count, records scanned past the index)
+def load_log(file, index_path, size=TOP_N):
+    file.seek(0, os.SEEK_END)
+    boards, end, count = load_index(index_path, file.tell(), size)
+    file.seek(end)
+    scanned = 0
+    for record, end in read_records(file):
+        boards.add(record)
+        scanned += 1
+    return boards, end, count + scanned, scanned
+
+# Leaderboards that are never written anywhere, with the same interface as
+# ScoreStore. Used for read-only listings and when the store can't be opened
+class MemoryScoreStore:
+    def __init__(self, size=TOP_N, boards=None, count=0):
+        self.boards = boards if boards is not None else Leaderboards(size)
+        self.count = count
+        self.error = None
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    def submit(self, profile, mode, score, **details):
+        record = {"profile": profile, "mode": mode, "score": score, "time": time.time()}
+        record.update(details)
+        self.count += 1
+        return self.boards.add(record)
+
+    def leaderboard(self, profile, mode):
+        return self.boards.top(profile, mode)
+
+    def high_score(self, profile, mode):
+        board = self.leaderboard(profile, mode)
+        return board[0]["score"] if board else 0
+
+    def close(self):
+        pass
+
+# The scores in a store directory, read without creating, repairing or
+# locking anything; a missing log reads as an empty store
+def read_scores(directory, size=TOP_N):
+    try:
+        file = open(os.path.join(directory, LOG_FILE), "rb")
+    except FileNotFoundError:
+        return MemoryScoreStore(size)
+    with file:
+        boards, _, count, _ = load_log(file, os.path.join(directory, INDEX_FILE), size)
+    return MemoryScoreStore(size, boards, count)
+
+class ScoreStore:
+    def __init__(self, directory, size=TOP_N):
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.error = None  # Last write error from the background thread
+
+        # Only the writer thread touches these after start-up
+        self.file = open(self.log_path, "a+b")
+        self.durable, self.end, self.count, scanned = load_log(self.file, self.index_path, size)
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() > self.end:
+            self.file.truncate(self.end)  # Drop a torn tail before appending after it
+        self.unindexed = scanned
+
+        self.lock = threading.Lock()
+        self.boards = Leaderboards.from_json(self.durable.to_json(), size)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._writer, name="score-writer", daemon=True)
+        self.thread.start()
+        if scanned >= INDEX_INTERVAL:
+            self.queue.put("index")  # Spare the next start-up the same scan
+
+    @property
+    def empty(self):
+        return self.count == 0 and self.queue.unfinished_tasks == 0
+
+    # Record a finished game. Returns its leaderboard rank (0 is best) or
+    # None; the write itself happens in the background
+    def submit(self, profile, mode, score, **details):
+        record = {"profile": profile, "mode": mode, "score": score, "time": time.time()}
+        record.update(details)
+        with self.lock:
+            rank = self.boards.add(record)
+        self.queue.put(record)
+        return rank
+
+    def leaderboard(self, profile, mode):
+        with self.lock:
+            return self.boards.top(profile, mode)
+
+    def high_score(self, profile, mode):
+        board = self.leaderboard(profile, mode)
+        return board[0]["score"] if board else 0
+
+    # Waits until everything submitted is on disk. If a write failed, the
+    # last error is left in self.error
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    if self.unindexed:
+                        self._write_index()
+                    return
+                if item == "index":
+                    self._write_index()
+                else:
+                    self._append(item)
+                    if self.unindexed >= INDEX_INTERVAL:
+                        self._write_index()
+            except OSError as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _append(self, record):
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        try:
+            self.file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            self.file.truncate(self.end)  # Don't leave half a record for the next append
+            raise
+        self.end += RECORD_HEADER.size + len(payload)
+        self.count += 1
+        self.unindexed += 1
+        self.durable.add(record)
+
+    def _write_index(self):
+        data = {"version": INDEX_VERSION, "log_size": self.end, "records": self.count,
+                "boards": self.durable.to_json()}
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.index_path)
+        self.unindexed = 0
@@ -0,0 +1,162 @@
+# Data-driven wave scheduling. A wave says what to spawn (enemies or
+# meteors), in which formation, how many, when, how often it repeats and
+# how its enemies fire. Pending spawns sit in a heap ordered by tick, and
+# a large formation can be spread over several ticks with per_tick so
+# its spawn cost is amortised.
+#
+# Wave files are JSON: {"waves": [{...}, ...]}. Times are in seconds:
+#   name        label for reports
+#   kind        "enemy" or "meteor"
+#   formation   "random", "line", "column", "v" or "grid"
+#   count       entities per occurrence (default 1)
+#   at          first occurrence (default 0)
+#   every       time between occurrences (default: never repeats)
+#   repeat      number of occurrences, 0 = forever (default 1, or 0 with every)
+#   per_tick    most entities spawned per tick (default: all at once)
+#   x           formation centre in pixels (default: screen centre)
+#   spacing     pixels between members (default 100)
+#   columns     members per row for "grid" (default 5)
+#   fire        "normal", "aggressive" or "none" (enemies only)
+# Any other key, or a value of the wrong type, makes the file invalid.
+import hashlib
+import heapq
+import json
+
+FORMATIONS = ("random", "line", "column", "v", "grid")
+KINDS = ("enemy", "meteor")
+# Fire odds: each tick an enemy fires when randint(0, odds) == 1; 0 never fires
+FIRE_PATTERNS = {"normal": 2 * 60, "aggressive": 30, "none": 0}
+# Every key a wave may have and the JSON types it accepts
+FIELD_TYPES = {
+    "name": str, "kind": str, "formation": str, "fire": str,
+    "count": int, "repeat": int, "per_tick": int, "columns": int,
+    "at": (int, float), "every": (int, float), "x": (int, float), "spacing": (int, float),
+}
+
+class Wave:
+    def __init__(self, name, kind, formation="random", count=1, at=0, every=0, repeat=1,
+                 per_tick=0, x=None, spacing=100, columns=5, fire_odds=FIRE_PATTERNS["normal"]):
+        if kind not in KINDS:
+            raise ValueError(f"wave {name!r}: kind must be one of {', '.join(KINDS)}")
+        if formation not in FORMATIONS:
+            raise ValueError(f"wave {name!r}: formation must be one of {', '.join(FORMATIONS)}")
+        if count < 1:
+            raise ValueError(f"wave {name!r}: count must be at least 1")
+        if repeat != 1 and every < 1:
+            raise ValueError(f"wave {name!r}: a repeating wave needs every > 0")
+        self.name = name
+        self.kind = kind
+        self.formation = formation
+        self.count = count
+        self.at = at  # All times are in ticks from here on
+        self.every = every
+        self.repeat = repeat
+        self.per_tick = per_tick if per_tick > 0 else count
+        self.x = x
+        self.spacing = spacing
+        self.columns = max(columns, 1)
+        self.fire_odds = fire_odds
+
+def parse_wave(data, ticks_per_second):
+    if not isinstance(data, dict):
+        raise ValueError(f"each wave must be an object, not {data!r}")
+    name = data.get("name", "wave")
+    for key, value in data.items():
+        if key not in FIELD_TYPES:
+            raise ValueError(f"wave {name!r}: unknown key {key!r}")
+        # bool is an int in Python but not a number here
+        if isinstance(value, bool) or not isinstance(value, FIELD_TYPES[key]):
+            raise ValueError(f"wave {name!r}: {key} can't be {value!r}")
+    fire = data.get("fire", "normal")
+    if fire not in FIRE_PATTERNS:
+        raise ValueError(f"wave {name!r}: fire must be one of {', '.join(FIRE_PATTERNS)}")
+    every = round(data.get("every", 0) * ticks_per_second)
+    return Wave(
+        name=name,
+        kind=data.get("kind", "enemy"),
+        formation=data.get("formation", "random"),
+        count=data.get("count", 1),
+        at=round(data.get("at", 0) * ticks_per_second),
+        every=every,
+        repeat=data.get("repeat", 0 if every else 1),
+        per_tick=data.get("per_tick", 0),
+        x=data.get("x"),
+        spacing=data.get("spacing", 100),
+        columns=data.get("columns", 5),
+        fire_odds=FIRE_PATTERNS[fire],
+    )
+
+# Raises ValueError naming the file if it can't be read or isn't a valid
+# wave file
+def load_waves(path, ticks_per_second):
+    try:
+        with open(path) as file:
+            data = json.load(file)
+        if not isinstance(data, dict) or not isinstance(data.get("waves"), list):
+            raise ValueError('expected {"waves": [...]} at the top level')
+        for key in data:
+            if key != "waves":
+                raise ValueError(f"unknown key {key!r}")
+        return [parse_wave(wave, ticks_per_second) for wave in data["waves"]]
+    except OSError as error:
+        raise ValueError(f"{path}: {error.strerror}") from error
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from error
+
+# Hash of a wave file's contents, so a recording can tell it was changed
+def file_digest(path, size=16):
+    with open(path, "rb") as file:
+        return hashlib.blake2b(file.read(), digest_size=size).digest()
+
+# Spawn positions for members [start, stop) of one occurrence of a wave.
+# Formations start just above the screen and extend upwards
+def formation_positions(wave, start, stop, screen_width, width, height, rng):
+    centre = wave.x if wave.x is not None else screen_width // 2
+    spacing = wave.spacing
+    positions = []
+    for i in range(start, stop):
+        if wave.formation == "random":
+            positions.append((rng.randint(0, screen_width - width), rng.randint(-100, -40)))
+            continue
+        if wave.formation == "line":
+            dx = (i - (wave.count - 1) / 2) * spacing
+            dy = 0
+        elif wave.formation == "column":
+            dx = 0
+            dy = i * spacing
+        elif wave.formation == "v":
+            # Leader in front, then alternating left and right behind it
+            rank = (i + 1) // 2
+            dx = rank * spacing * (-1 if i % 2 else 1)
+            dy = rank * spacing
+        else:  # grid
+            row, column = divmod(i, wave.columns)
+            dx = (column - (min(wave.columns, wave.count) - 1) / 2) * spacing
+            dy = row * spacing
+        x = int(centre + dx - width / 2)
+        positions.append((min(max(x, 0), screen_width - width), int(-height - dy)))
+    return positions
+
+class WaveScheduler:
+    def __init__(self, waves):
+        # (tick, wave number, occurrence, first member, wave). Batches due
+        # on the same tick come out in the order the waves were defined
+        self.queue = []
+        self.batches = 0  # Spawn batches handed out so far
+        for number, wave in enumerate(waves):
+            heapq.heappush(self.queue, (wave.at, number, 0, 0, wave))
+
+    # Pop every batch due by `tick`: a list of (wave, first, stop) member ranges
+    def due(self, tick):
+        batches = []
+        queue = self.queue
+        while queue and queue[0][0] <= tick:
+            due_tick, number, occurrence, start, wave = heapq.heappop(queue)
+            stop = min(start + wave.per_tick, wave.count)
+            batches.append((wave, start, stop))
+            if stop < wave.count:
+                heapq.heappush(queue, (due_tick + 1, number, occurrence, stop, wave))
+            if start == 0 and (wave.repeat == 0 or occurrence + 1 < wave.repeat):
+                heapq.heappush(queue, (wave.at + (occurrence + 1) * wave.every, number, occurrence + 1, 0, wave))
+        self.batches += len(batches)
+        return batches